@@ -1,9 +1,15 @@
 """CLI for documentation site."""
 
-import subprocess
+import os
 import sys
 from pathlib import Path
 
+MKDOCS_COMMANDS = {
+    "serve": "serve",
+    "build": "build",
+    "deploy": "gh-deploy",
+}
+
 
 def main() -> int:
     """Define main CLI entry point."""
@@ -14,16 +20,14 @@ def main() -> int:
     else:
         command = "serve"
 
-    if command == "serve":
-        return subprocess.call(["mkdocs", "serve"], cwd=docs_dir)
-    if command == "build":
-        return subprocess.call(["mkdocs", "build"], cwd=docs_dir)
-    if command == "deploy":
-        return subprocess.call(["mkdocs", "gh-deploy"], cwd=docs_dir)
+    if command not in MKDOCS_COMMANDS:
+        print(f"Unknown command: {command}")
+        print("Available commands: serve, build, deploy")
+        return 1
 
-    print(f"Unknown command: {command}")
-    print("Available commands: serve, build, deploy")
-    return 1
+    # Replace this interpreter with mkdocs rather than waiting on a child process
+    os.chdir(docs_dir)
+    os.execvp("mkdocs", ["mkdocs", MKDOCS_COMMANDS[command]])
 
 
 if __name__ == "__main__":
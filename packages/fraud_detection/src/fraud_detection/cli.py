@@ -3,18 +3,28 @@
 import argparse
 import logging
 import sys
+from datetime import date
 
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
+from pyspark.sql.types import ArrayType
 
 from fraud_detection.detector import FraudDetector
+from fraud_detection.schema import RESULTS_CSV_SCHEMA
+from fraud_detection.utils.io import read_claims
 from fraud_detection.utils.sample_data import generate_sample_claims
+from fraud_detection.utils.spark import create_spark_session
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on rows per CSV part file written by ``run``
+CSV_MAX_RECORDS_PER_FILE = 1_000_000
+
 
 def main() -> int:
     """Define main CLI entry point."""
+    logging.basicConfig(level=logging.INFO)
+
     parser = argparse.ArgumentParser(
         description="Insurance claims fraud detection CLI",
         prog="fraud-detect",
@@ -22,33 +32,49 @@ def main() -> int:
 
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
-    # Run command
-    run_parser = subparsers.add_parser("run", help="Run fraud detection on claims data")
-    run_parser.add_argument(
+    # Arguments shared by run and run-and-analyze
+    run_arguments = argparse.ArgumentParser(add_help=False)
+    run_arguments.add_argument(
         "--input",
         "-i",
         required=True,
         help="Input path for claims data",
     )
-    run_parser.add_argument(
+    run_arguments.add_argument(
         "--output",
         "-o",
         required=True,
         help="Output path for results",
     )
-    run_parser.add_argument(
+    run_arguments.add_argument(
         "--format",
         "-f",
         default="parquet",
         choices=["parquet", "csv", "json"],
         help="Data format (default: parquet)",
     )
-    run_parser.add_argument(
+    run_arguments.add_argument(
         "--local",
         action="store_true",
         help="Run in local mode",
     )
 
+    # Run command
+    subparsers.add_parser("run", parents=[run_arguments], help="Run fraud detection on claims data")
+
+    # Run and analyze command
+    run_analyze_parser = subparsers.add_parser(
+        "run-and-analyze",
+        parents=[run_arguments],
+        help="Run fraud detection and report on the results using a single Spark session",
+    )
+    run_analyze_parser.add_argument(
+        "--report",
+        default="summary",
+        choices=["summary", "providers", "benfords"],
+        help="Type of analysis report",
+    )
+
     # Analyze command
     analyze_parser = subparsers.add_parser(
         "analyze",
@@ -73,6 +99,12 @@ def main() -> int:
         choices=["csv", "parquet", "json"],
         help="Format of results data (default: csv)",
     )
+    analyze_parser.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=None,
+        help="Only analyze results with this detection_date (YYYY-MM-DD)",
+    )
 
     # Generate sample data command
     sample_parser = subparsers.add_parser(
@@ -98,6 +130,13 @@ def main() -> int:
         default=0.05,
         help="Approximate rate of fraudulent claims (0-1)",
     )
+    sample_parser.add_argument(
+        "--format",
+        "-f",
+        default="parquet",
+        choices=["parquet", "csv"],
+        help="Output format (default: parquet)",
+    )
 
     args = parser.parse_args()
 
@@ -105,37 +144,26 @@ def main() -> int:
         parser.print_help()
         return 1
 
-    if args.command == "run":
-        return run_detection(args)
-
-    if args.command == "analyze":
-        return run_analysis(args)
-
-    if args.command == "generate-sample":
-        return generate_sample(args)
+    handlers = {
+        "run": run_detection,
+        "run-and-analyze": run_and_analyze,
+        "analyze": run_analysis,
+        "generate-sample": generate_sample,
+    }
+    return handlers[args.command](args)
 
-    return 0
 
-
-def run_detection(args: argparse.Namespace) -> int:
-    """Run fraud detection job."""
+def run_detection(args: argparse.Namespace, spark: SparkSession | None = None) -> int:
+    """Run fraud detection job, stopping the session afterwards only if it was created here."""
     logger.info("Running fraud detection on %s", args.input)
 
-    builder = SparkSession.builder.appName("FraudDetectionCLI")
-
-    if args.local:
-        builder = builder.master("local[*]")
-
-    spark = builder.getOrCreate()
+    owns_session = spark is None
+    if spark is None:
+        spark = create_spark_session("FraudDetectionCLI", local=args.local)
 
     try:
         # Read data
-        if args.format == "csv":
-            claims = spark.read.option("header", "true").option("inferSchema", "true").csv(args.input)
-        elif args.format == "json":
-            claims = spark.read.json(args.input)
-        else:
-            claims = spark.read.parquet(args.input)
+        claims = read_claims(spark, args.input, fmt=args.format)
 
         logger.info("Loaded %d claims", claims.count())
 
@@ -146,11 +174,12 @@ def run_detection(args: argparse.Namespace) -> int:
         # Write results
         if args.format == "csv":
             # Convert array columns to strings for CSV compatibility
-            csv_results = results
-            for field in results.schema.fields:
-                if "ArrayType" in str(field.dataType):
-                    csv_results = csv_results.withColumn(field.name, F.concat_ws(", ", F.col(field.name)))
-            csv_results.write.mode("overwrite").option("header", "true").csv(args.output)
+            array_columns = {field.name for field in results.schema.fields if isinstance(field.dataType, ArrayType)}
+            csv_results = results.select(
+                *[F.concat_ws(", ", F.col(name)).alias(name) if name in array_columns else F.col(name) for name in results.columns]
+            )
+            # Cap rows per part file so large results do not end up in a few multi-GB CSV files
+            csv_results.write.mode("overwrite").option("header", "true").option("maxRecordsPerFile", CSV_MAX_RECORDS_PER_FILE).csv(args.output)
         elif args.format == "json":
             results.write.mode("overwrite").json(args.output)
         else:
@@ -164,30 +193,56 @@ def run_detection(args: argparse.Namespace) -> int:
         return 1
 
     finally:
-        spark.stop()
+        if owns_session:
+            spark.stop()
 
 
-def run_analysis(args: argparse.Namespace) -> int:
-    """Run analysis on fraud detection results."""
-    spark = SparkSession.builder.appName("FraudAnalysis").master("local[*]").getOrCreate()
-    spark.sparkContext.setLogLevel("ERROR")
+def run_analysis(args: argparse.Namespace, spark: SparkSession | None = None) -> int:
+    """Run analysis on fraud detection results, stopping the session afterwards only if it was created here."""
+    owns_session = spark is None
+    if spark is None:
+        spark = create_spark_session("FraudAnalysis", local=True)
+        spark.sparkContext.setLogLevel("ERROR")
 
     try:
         # Read results in the specified format
         if args.format == "csv":
-            results = spark.read.option("header", "true").option("inferSchema", "true").csv(args.results)
+            results = spark.read.option("header", "true").schema(RESULTS_CSV_SCHEMA).csv(args.results)
         elif args.format == "json":
             results = spark.read.json(args.results)
         else:
-            results = spark.read.parquet(args.results)
+            # Anchor partition discovery at the results root so detection_date is exposed as a column
+            results = spark.read.option("basePath", args.results).parquet(args.results)
+
+        if args.date is not None:
+            if "detection_date" not in results.columns:
+                logger.error("--date requires results partitioned by detection_date")
+                return 1
+            # Filter on the partition column so only the matching directory is listed and read
+            results = results.filter(F.col("detection_date") == F.lit(args.date))
 
         if args.report == "summary":
             logger.info("Generating fraud detection summary report")
 
-            total = results.count()
-            high_risk = results.filter(F.col("fraud_score") > 0.7).count()
-            medium_risk = results.filter((F.col("fraud_score") > 0.3) & (F.col("fraud_score") <= 0.7)).count()
-            low_risk = results.filter(F.col("fraud_score") <= 0.3).count()
+            # Risk-band counts and score distribution come from a single aggregation (one scan)
+            counts = results.agg(
+                F.count(F.lit(1)).alias("total"),
+                F.sum(F.when(F.col("fraud_score") > 0.7, 1).otherwise(0)).alias("high_risk"),
+                F.sum(F.when((F.col("fraud_score") > 0.3) & (F.col("fraud_score") <= 0.7), 1).otherwise(0)).alias("medium_risk"),
+                F.sum(F.when(F.col("fraud_score") <= 0.3, 1).otherwise(0)).alias("low_risk"),
+                F.mean("fraud_score").alias("mean"),
+                F.stddev("fraud_score").alias("stddev"),
+                F.min("fraud_score").alias("min"),
+                F.max("fraud_score").alias("max"),
+            ).first()
+            if not counts or not counts["total"]:
+                logger.info("No fraud detection results found in %s", args.results)
+                return 0
+
+            total = counts["total"]
+            high_risk = counts["high_risk"]
+            medium_risk = counts["medium_risk"]
+            low_risk = counts["low_risk"]
 
             logger.info("Fraud Detection Summary")
             logger.info("Total claims analyzed: %d", total)
@@ -196,12 +251,10 @@ def run_analysis(args: argparse.Namespace) -> int:
             logger.info("Low risk (<=0.3):      %d (%.1f%%)", low_risk, low_risk / total * 100)
 
             logger.info("Score Distribution")
-            results.select(
-                F.mean("fraud_score").alias("mean"),
-                F.stddev("fraud_score").alias("stddev"),
-                F.min("fraud_score").alias("min"),
-                F.max("fraud_score").alias("max"),
-            ).show()
+            logger.info("Mean:   %.4f", counts["mean"])
+            logger.info("Stddev: %.4f", counts["stddev"] or 0.0)
+            logger.info("Min:    %.4f", counts["min"])
+            logger.info("Max:    %.4f", counts["max"])
 
         elif args.report == "providers":
             logger.info("High Risk Providers")
@@ -221,6 +274,23 @@ def run_analysis(args: argparse.Namespace) -> int:
         logger.exception("Error running analysis: %s", e)
         return 1
 
+    finally:
+        if owns_session:
+            spark.stop()
+
+
+def run_and_analyze(args: argparse.Namespace) -> int:
+    """Run fraud detection and analyze its output, sharing one Spark session."""
+    spark = create_spark_session("FraudDetectionCLI", local=args.local)
+
+    try:
+        status = run_detection(args, spark)
+        if status != 0:
+            return status
+
+        analysis_args = argparse.Namespace(results=args.output, report=args.report, format=args.format, date=None)
+        return run_analysis(analysis_args, spark)
+
     finally:
         spark.stop()
 
@@ -234,6 +304,7 @@ def generate_sample(args: argparse.Namespace) -> int:
             args.output,
             num_claims=args.num_claims,
             fraud_rate=args.fraud_rate,
+            fmt=args.format,
         )
         logger.info("Sample data written to %s", args.output)
         return 0
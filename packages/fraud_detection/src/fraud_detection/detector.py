@@ -26,6 +26,7 @@ from pyspark.sql import functions as F
 from fraud_detection.rules.billing_patterns import BillingPatternRules
 from fraud_detection.rules.duplicates import DuplicateDetector
 from fraud_detection.rules.geographic import GeographicRules
+from fraud_detection.schema import coerce_claim_types
 from fraud_detection.statistics.benfords import BenfordsLawAnalyzer
 from fraud_detection.statistics.outliers import OutlierDetector
 
@@ -52,6 +53,11 @@ class DetectionConfig:
         Higher values require closer matches.
     duplicate_time_window_days : int, default 30
         Maximum days between claims to consider them potential duplicates.
+    duplicate_group_keys : tuple of str, default ("patient_id", "provider_id")
+        Order of the keys near-duplicate candidates are grouped and shuffled by.
+        Put the higher-cardinality column first; swap the order for data with
+        more providers than patients. Must be an ordering of ``patient_id`` and
+        ``provider_id``; ``DuplicateDetector`` rejects anything else.
     max_provider_patient_distance_miles : float, default 500.0
         Maximum reasonable distance between patient and provider locations.
     max_daily_procedures_per_provider : int, default 50
@@ -64,6 +70,12 @@ class DetectionConfig:
         Weight for statistical anomalies in composite fraud score.
     weight_duplicate : float, default 0.45
         Weight for duplicate detection in composite fraud score.
+    materialize_duplicates : bool, default True
+        If True, duplicate detection persists its input for the pipeline and
+        returns a result materialized with a local checkpoint, releasing its
+        cache afterwards. If False, it persists nothing and returns a lazy
+        result, for callers that manage caching themselves. An input the
+        caller has already cached is read through and left cached either way.
 
     Examples
     --------
@@ -79,12 +91,14 @@ class DetectionConfig:
     outlier_iqr_multiplier: float = 1.5
     duplicate_similarity_threshold: float = 0.9
     duplicate_time_window_days: int = 30
+    duplicate_group_keys: tuple[str, str] = ("patient_id", "provider_id")
     max_provider_patient_distance_miles: float = 500.0
     max_daily_procedures_per_provider: int = 50
     max_claims_per_patient_per_day: int = 5
     weight_rule_violation: float = 0.3
     weight_statistical_anomaly: float = 0.25
     weight_duplicate: float = 0.45
+    materialize_duplicates: bool = True
 
 
 class FraudDetector:
@@ -171,6 +185,12 @@ class FraudDetector:
             - ``duplicate_of`` : str - Original claim ID if duplicate.
             - ``processed_at`` : timestamp - When analysis was performed.
         """
+        claims = coerce_claim_types(claims)
+
+        # Hash-partition once by provider: every provider-keyed window/aggregation downstream
+        # (daily procedure counts, weekend/round ratios) then runs without its own exchange
+        claims = claims.repartition("provider_id")
+
         claims_with_rules = self._apply_rules(claims)
         claims_with_stats = self._apply_statistics(claims_with_rules)
         claims_with_duplicates = self._detect_duplicates(claims_with_stats)
@@ -195,15 +215,20 @@ class FraudDetector:
         DataFrame
             Claims with rule violation flags added.
         """
-        claims = self.billing_rules.check_daily_procedure_limits(claims)
-        claims = self.billing_rules.check_patient_claim_frequency(claims)
-        claims = self.billing_rules.check_weekend_billing(claims)
-        claims = self.billing_rules.check_round_amounts(claims)
-
-        claims = self.geographic_rules.check_provider_patient_distance(claims)
-        claims = self.geographic_rules.check_state_mismatch(claims)
+        # Row-local indicators (including the Benford leading digit used later by
+        # _apply_statistics) are evaluated together in one projection; the rule checks
+        # below only add the provider/day aggregates on top of them
+        claims = claims.withColumns(
+            {
+                **self.billing_rules.weekend_columns(),
+                **self.billing_rules.round_amount_columns(),
+                **self.geographic_rules.distance_columns(claims, include_distance=False),
+                "state_mismatch": self.geographic_rules.state_mismatch_expr(claims),
+                **self.benfords_analyzer.first_digit_columns("charge_amount"),
+            }
+        )
 
-        return claims
+        return self.billing_rules.apply_all(claims)
 
     def _apply_statistics(self, claims: DataFrame) -> DataFrame:
         """
@@ -222,8 +247,7 @@ class FraudDetector:
         DataFrame
             Claims with statistical anomaly flags added.
         """
-        claims = self.outlier_detector.detect_zscore_outliers(claims, "charge_amount", "charge_zscore_outlier")
-        claims = self.outlier_detector.detect_iqr_outliers(claims, "charge_amount", "charge_iqr_outlier")
+        claims = self.outlier_detector.detect_zscore_and_iqr_outliers(claims, "charge_amount", "charge_zscore_outlier", "charge_iqr_outlier")
         claims = self.benfords_analyzer.analyze(claims, "charge_amount")
 
         return claims
@@ -282,65 +306,31 @@ class FraudDetector:
             "benfords_anomaly",
         ]
 
-        claims = claims.withColumn(
-            "rule_violations",
-            F.array(*[F.when(F.col(col), F.lit(col)).otherwise(F.lit(None)) for col in rule_columns if col in claims.columns]),
-        )
-        claims = claims.withColumn(
-            "rule_violations",
-            F.expr("filter(rule_violations, x -> x is not null)"),
-        )
-
-        claims = claims.withColumn(
-            "statistical_flags",
-            F.array(*[F.when(F.col(col), F.lit(col)).otherwise(F.lit(None)) for col in stat_columns if col in claims.columns]),
-        )
-        claims = claims.withColumn(
-            "statistical_flags",
-            F.expr("filter(statistical_flags, x -> x is not null)"),
-        )
-
-        claims = claims.withColumn(
-            "rule_score",
-            F.size("rule_violations") / F.lit(len(rule_columns)),
-        )
+        rule_violations = F.array_compact(F.array(*[F.when(F.col(col), F.lit(col)) for col in rule_columns if col in claims.columns]))
+        statistical_flags = F.array_compact(F.array(*[F.when(F.col(col), F.lit(col)) for col in stat_columns if col in claims.columns]))
 
-        claims = claims.withColumn(
-            "stat_score",
-            F.size("statistical_flags") / F.lit(len(stat_columns)),
-        )
+        # Fold each category's weight and normalisation into one per-flag constant on the driver,
+        # so each row does a multiply-add per category instead of a divide and a multiply
+        rule_weight = self.config.weight_rule_violation / len(rule_columns)
+        stat_weight = self.config.weight_statistical_anomaly / len(stat_columns)
 
-        claims = claims.withColumn(
-            "duplicate_score",
-            F.when(F.col("is_duplicate"), F.lit(1.0)).otherwise(F.lit(0.0)),
+        fraud_score = (
+            F.size(rule_violations) * F.lit(rule_weight)
+            + F.size(statistical_flags) * F.lit(stat_weight)
+            + F.when(F.col("is_duplicate"), F.lit(self.config.weight_duplicate)).otherwise(F.lit(0.0))
         )
 
-        claims = claims.withColumn(
-            "fraud_score",
-            (
-                F.col("rule_score") * F.lit(self.config.weight_rule_violation)
-                + F.col("stat_score") * F.lit(self.config.weight_statistical_anomaly)
-                + F.col("duplicate_score") * F.lit(self.config.weight_duplicate)
-            ),
-        )
-
-        claims = claims.withColumn(
-            "fraud_reasons",
-            F.concat(F.col("rule_violations"), F.col("statistical_flags")),
-        )
-
-        claims = claims.withColumn("processed_at", F.current_timestamp())
-
+        # Single projection: intermediate scores are inlined rather than materialized as columns
         return claims.select(
             "claim_id",
             "patient_id",
             "provider_id",
             "charge_amount",
-            "fraud_score",
-            "fraud_reasons",
-            "rule_violations",
-            "statistical_flags",
+            fraud_score.alias("fraud_score"),
+            F.array_union(rule_violations, statistical_flags).alias("fraud_reasons"),
+            rule_violations.alias("rule_violations"),
+            statistical_flags.alias("statistical_flags"),
             "is_duplicate",
             "duplicate_of",
-            "processed_at",
+            F.current_timestamp().alias("processed_at"),
         )
@@ -14,16 +14,53 @@ frequencies, and amount characteristics to identify anomalies such as:
 
 from __future__ import annotations
 
+from functools import partial
 from typing import TYPE_CHECKING
 
-from pyspark.sql import DataFrame, Window
+import pandas as pd  # type: ignore[import-untyped]
+from pyspark.sql import DataFrame
 from pyspark.sql import functions as F
 
+from fraud_detection.schema import coerce_claim_types
+
 if TYPE_CHECKING:
     from pyspark.sql import SparkSession
 
     from fraud_detection.detector import DetectionConfig
 
+VISIT_KEYS = ["patient_id", "service_date", "provider_id"]
+
+UNBUNDLING_VISIT_SCHEMA = "patient_id string, service_date date, provider_id string, procedures_same_day array<string>, bundled_code string"
+
+
+def _find_unbundled_visit(visit: pd.DataFrame, bundles: dict[str, list[tuple[str, str]]]) -> pd.DataFrame:
+    """
+    Match the procedures billed in one visit against the known bundles.
+
+    Parameters
+    ----------
+    visit : pd.DataFrame
+        Claims of a single patient/provider/date visit with the visit key
+        columns and ``procedure_code``.
+    bundles : dict[str, list[tuple[str, str]]]
+        Maps each first component code to its ``(second component code,
+        bundled code)`` pairs.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row with the visit keys, the sorted distinct ``procedures_same_day``
+        and the ``bundled_code`` of a bundle whose components were both billed
+        (the smallest code if several match), or None.
+    """
+    codes = set(visit["procedure_code"].dropna())
+    matches = [bundled for code in codes for other, bundled in bundles.get(code, ()) if other in codes]
+
+    return visit.iloc[:1][VISIT_KEYS].assign(
+        procedures_same_day=[sorted(codes)],
+        bundled_code=min(matches, default=None),
+    )
+
 
 class BillingPatternRules:
     """
@@ -58,6 +95,138 @@ class BillingPatternRules:
         self.spark = spark
         self.config = config
 
+    def apply_all(self, claims: DataFrame) -> DataFrame:
+        """
+        Run the daily limit, patient frequency, weekend and round amount checks together.
+
+        Equivalent to calling :meth:`check_daily_procedure_limits`,
+        :meth:`check_patient_claim_frequency`, :meth:`check_weekend_billing`
+        and :meth:`check_round_amounts` in sequence, but computes the row-level
+        indicators in one projection and the weekend and round ratios in a
+        single provider ``groupBy``, rather than one aggregate and join per check.
+
+        Parameters
+        ----------
+        claims : DataFrame
+            Input claims with ``provider_id``, ``patient_id``, ``service_date``
+            and ``charge_amount`` columns.
+
+        Returns
+        -------
+        DataFrame
+            Claims with all columns added by the four individual checks.
+        """
+        claims = self._with_missing_columns(coerce_claim_types(claims), {**self.weekend_columns(), **self.round_amount_columns()})
+
+        provider_stats = claims.groupBy("provider_id").agg(
+            self._share_of("is_weekend").alias("provider_weekend_ratio"),
+            self._share_of("is_round_hundred").alias("provider_round_ratio"),
+        )
+        provider_daily = claims.groupBy("provider_id", "service_date").agg(F.count("*").alias("daily_procedure_count"))
+        patient_daily = claims.groupBy("patient_id", "service_date").agg(F.count("*").alias("patient_daily_claims"))
+
+        claims = (
+            claims.join(F.broadcast(provider_stats), "provider_id", "left")
+            .join(provider_daily, ["provider_id", "service_date"], "left")
+            .join(patient_daily, ["patient_id", "service_date"], "left")
+        )
+
+        return claims.withColumns(
+            {
+                "daily_procedure_limit_exceeded": F.col("daily_procedure_count") > F.lit(self.config.max_daily_procedures_per_provider),
+                "patient_frequency_exceeded": F.col("patient_daily_claims") > F.lit(self.config.max_claims_per_patient_per_day),
+                "weekend_billing_flag": F.col("is_weekend") & (F.col("provider_weekend_ratio") > 0.30),
+                "round_amount_flag": F.col("is_round_hundred") & (F.col("provider_round_ratio") > 0.20),
+            }
+        )
+
+    def weekend_columns(self) -> dict[str, F.Column]:
+        """
+        Build the row-local weekend indicator expressions.
+
+        Returns
+        -------
+        dict[str, Column]
+            Expressions keyed by output column name:
+
+            - ``day_of_week`` : Day of week (1=Sunday, 7=Saturday).
+            - ``is_weekend`` : True if service date falls on weekend.
+        """
+        # Plain modular arithmetic on days since the epoch (a Thursday); pmod keeps
+        # dates before 1970 non-negative
+        days = F.unix_date("service_date")
+
+        return {
+            "day_of_week": F.pmod(days + 4, 7) + 1,
+            "is_weekend": F.pmod(days + 3, 7) >= 5,
+        }
+
+    def round_amount_columns(self) -> dict[str, F.Column]:
+        """
+        Build the row-local round amount indicator expressions.
+
+        Returns
+        -------
+        dict[str, Column]
+            Expressions keyed by output column name:
+
+            - ``is_round_hundred`` : True if amount is divisible by 100.
+            - ``is_round_fifty`` : True if amount is divisible by 50.
+        """
+        # One remainder serves both flags: multiples of 50 leave 0 or 50 modulo 100
+        remainder = F.col("charge_amount") % 100
+        is_round_fifty = remainder.isin(0, 50) & (F.col("charge_amount") > 0)
+
+        return {
+            "is_round_hundred": is_round_fifty & (remainder == 0),
+            "is_round_fifty": is_round_fifty,
+        }
+
+    @staticmethod
+    def _with_missing_columns(claims: DataFrame, columns: dict[str, F.Column]) -> DataFrame:
+        """
+        Add the given columns in one projection, skipping any already present.
+
+        Lets the provider-level checks reuse indicators that the caller has
+        already computed in a fused projection.
+
+        Parameters
+        ----------
+        claims : DataFrame
+            Input claims.
+        columns : dict[str, Column]
+            Expressions keyed by output column name.
+
+        Returns
+        -------
+        DataFrame
+            Claims with every key of ``columns`` present.
+        """
+        missing = {name: expr for name, expr in columns.items() if name not in claims.columns}
+        return claims.withColumns(missing) if missing else claims
+
+    @staticmethod
+    def _share_of(indicator: str) -> F.Column:
+        """
+        Build an aggregate for the fraction of rows where a boolean indicator is true.
+
+        Counts the true values directly instead of averaging a per-row cast to
+        double. As with ``avg``, null indicators are ignored and a group with
+        only nulls yields null.
+
+        Parameters
+        ----------
+        indicator : str
+            Name of a boolean column.
+
+        Returns
+        -------
+        Column
+            Aggregate expression for use in ``agg``.
+        """
+        known = F.count(indicator)
+        return F.when(known > 0, F.count_if(F.col(indicator)) / known)
+
     def check_daily_procedure_limits(self, claims: DataFrame) -> DataFrame:
         """
         Flag providers exceeding daily procedure limits.
@@ -82,12 +251,10 @@ class BillingPatternRules:
             - ``daily_procedure_count`` : int - Total procedures by this provider on this date.
             - ``daily_procedure_limit_exceeded`` : bool - True if count exceeds configured limit.
         """
-        window = Window.partitionBy("provider_id", "service_date")
+        claims = coerce_claim_types(claims)
 
-        claims = claims.withColumn(
-            "daily_procedure_count",
-            F.count("*").over(window),
-        )
+        daily_counts = claims.groupBy("provider_id", "service_date").agg(F.count("*").alias("daily_procedure_count"))
+        claims = claims.join(daily_counts, ["provider_id", "service_date"], "left")
 
         claims = claims.withColumn(
             "daily_procedure_limit_exceeded",
@@ -117,12 +284,10 @@ class BillingPatternRules:
             - ``patient_daily_claims`` : int - Number of claims for this patient on this date.
             - ``patient_frequency_exceeded`` : bool - True if count exceeds configured limit.
         """
-        window = Window.partitionBy("patient_id", "service_date")
+        claims = coerce_claim_types(claims)
 
-        claims = claims.withColumn(
-            "patient_daily_claims",
-            F.count("*").over(window),
-        )
+        daily_counts = claims.groupBy("patient_id", "service_date").agg(F.count("*").alias("patient_daily_claims"))
+        claims = claims.join(daily_counts, ["patient_id", "service_date"], "left")
 
         claims = claims.withColumn(
             "patient_frequency_exceeded",
@@ -158,22 +323,13 @@ class BillingPatternRules:
             - ``provider_weekend_ratio`` : float - Proportion of provider's claims on weekends.
             - ``weekend_billing_flag`` : bool - True if weekend claim from high-weekend provider.
         """
-        claims = claims.withColumn(
-            "day_of_week",
-            F.dayofweek("service_date"),
-        )
-
-        claims = claims.withColumn(
-            "is_weekend",
-            F.col("day_of_week").isin([1, 7]),
-        )
-
-        window = Window.partitionBy("provider_id")
+        claims = self._with_missing_columns(coerce_claim_types(claims), self.weekend_columns())
 
-        claims = claims.withColumn(
-            "provider_weekend_ratio",
-            F.avg(F.col("is_weekend").cast("double")).over(window),
+        # One row per provider, broadcast back instead of a provider-wide window over every claim
+        provider_ratio = claims.groupBy("provider_id").agg(
+            self._share_of("is_weekend").alias("provider_weekend_ratio"),
         )
+        claims = claims.join(F.broadcast(provider_ratio), "provider_id", "left")
 
         claims = claims.withColumn(
             "weekend_billing_flag",
@@ -209,22 +365,12 @@ class BillingPatternRules:
             - ``provider_round_ratio`` : float - Proportion of provider's claims with round amounts.
             - ``round_amount_flag`` : bool - True if round amount from high-round-ratio provider.
         """
-        claims = claims.withColumn(
-            "is_round_hundred",
-            (F.col("charge_amount") % 100 == 0) & (F.col("charge_amount") > 0),
-        )
+        claims = self._with_missing_columns(coerce_claim_types(claims), self.round_amount_columns())
 
-        claims = claims.withColumn(
-            "is_round_fifty",
-            (F.col("charge_amount") % 50 == 0) & (F.col("charge_amount") > 0),
-        )
-
-        window = Window.partitionBy("provider_id")
-
-        claims = claims.withColumn(
-            "provider_round_ratio",
-            F.avg(F.col("is_round_hundred").cast("double")).over(window),
+        provider_ratio = claims.groupBy("provider_id").agg(
+            self._share_of("is_round_hundred").alias("provider_round_ratio"),
         )
+        claims = claims.join(F.broadcast(provider_ratio), "provider_id", "left")
 
         claims = claims.withColumn(
             "round_amount_flag",
@@ -263,21 +409,25 @@ class BillingPatternRules:
 
             - ``procedures_same_day`` : array<str> - All procedure codes for this
               patient/provider/date combination.
+            - ``bundled_code`` : str - Bundle whose components were billed in the
+              visit, or null.
             - ``unbundling_flag`` : bool - True if unbundled procedure pair detected.
         """
-        window = Window.partitionBy("patient_id", "service_date", "provider_id")
-
-        claims = claims.withColumn(
-            "procedures_same_day",
-            F.collect_set("procedure_code").over(window),
+        claims = coerce_claim_types(claims)
+
+        # The reference table is small: collect it into a lookup that ships with the
+        # function, so each visit is matched with set lookups instead of a join
+        bundles: dict[str, list[tuple[str, str]]] = {}
+        for row in bundled_procedures.dropna(subset=["bundled_code", "unbundled_code_1", "unbundled_code_2"]).collect():
+            bundles.setdefault(row.unbundled_code_1, []).append((row.unbundled_code_2, row.bundled_code))
+
+        visits = (
+            claims.select(*VISIT_KEYS, "procedure_code")
+            .groupBy(*VISIT_KEYS)
+            .applyInPandas(partial(_find_unbundled_visit, bundles=bundles), schema=UNBUNDLING_VISIT_SCHEMA)
         )
 
-        claims = claims.join(
-            bundled_procedures,
-            F.array_contains(F.col("procedures_same_day"), F.col("unbundled_code_1"))
-            & F.array_contains(F.col("procedures_same_day"), F.col("unbundled_code_2")),
-            "left",
-        )
+        claims = claims.join(visits, VISIT_KEYS, "left")
 
         claims = claims.withColumn(
             "unbundling_flag",
@@ -8,16 +8,93 @@ resubmission with minor modifications to avoid detection.
 
 from __future__ import annotations
 
+from functools import partial
 from typing import TYPE_CHECKING
 
-from pyspark.sql import DataFrame, Window
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame
 from pyspark.sql import functions as F
 
+from fraud_detection.schema import coerce_claim_types
+from fraud_detection.utils.spark import checkpoint_and_release
+
 if TYPE_CHECKING:
     from pyspark.sql import SparkSession
 
     from fraud_detection.detector import DetectionConfig
 
+NEAR_DUPLICATE_PAIRS_SCHEMA = "claim_id string, near_duplicate_of string"
+
+
+def _pairs_within_window(claims: pd.DataFrame, window_days: int, threshold: float) -> pd.DataFrame:
+    """
+    Find the best near-duplicate match for each anchor claim in one group.
+
+    A group holds the claims of one patient-provider pair whose service dates
+    fall in a date bucket or either neighbouring bucket. Only the anchors, the
+    claims from the bucket itself, are matched; the neighbours are there so
+    every claim within ``window_days`` of an anchor is in the group.
+
+    Claims are sorted by service day so that the claims within ``window_days``
+    of each anchor form a contiguous slice, located with a binary search instead
+    of comparing every pair in the group. Pairs are scored as vectors and only
+    the highest-scoring match at or above ``threshold`` is kept per claim.
+
+    Parameters
+    ----------
+    claims : pd.DataFrame
+        Claims of a single group with columns ``claim_id``, ``service_day``
+        (days since epoch), ``procedure_code``, ``charge_amount`` (float) and
+        ``is_anchor``.
+    window_days : int
+        Maximum days between service dates for a pair.
+    threshold : float
+        Minimum similarity score for a match.
+
+    Returns
+    -------
+    pd.DataFrame
+        At most one row per ``claim_id``, naming in ``near_duplicate_of`` its most
+        similar claim with a smaller ``claim_id``. Pairs of zero charges have no
+        defined similarity and are never matched.
+    """
+    claims = claims.sort_values("service_day", kind="stable")
+    days = claims["service_day"].to_numpy()
+    anchors = np.flatnonzero(claims["is_anchor"].to_numpy(dtype=bool))
+
+    start = np.searchsorted(days, days[anchors] - window_days, side="left")
+    end = np.searchsorted(days, days[anchors] + window_days, side="right")
+    counts = end - start
+
+    left = np.repeat(anchors, counts)
+    right = np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    claim_ids = claims["claim_id"].to_numpy()
+    charges = claims["charge_amount"].to_numpy(dtype=np.float64)
+    largest_charge = np.maximum(charges[left], charges[right])
+    # Pairs of zero charges have no defined similarity and can never match
+    keep = (claim_ids[left] > claim_ids[right]) & (largest_charge != 0)
+    left, right = left[keep], right[keep]
+
+    codes = claims["procedure_code"].to_numpy()
+    procedure_match = (codes[left] == codes[right]).astype(np.float64)
+    charge_similarity = 1.0 - np.abs(charges[left] - charges[right]) / largest_charge[keep]
+    similarity_score = 0.6 * procedure_match + 0.4 * charge_similarity
+
+    matched = similarity_score >= threshold
+    pairs = pd.DataFrame(
+        {
+            "claim_id": claim_ids[left[matched]],
+            "near_duplicate_of": claim_ids[right[matched]],
+            "similarity_score": similarity_score[matched],
+        }
+    )
+
+    best = pairs.sort_values("similarity_score", ascending=False, kind="stable").drop_duplicates("claim_id")
+    return best[["claim_id", "near_duplicate_of"]]
+
 
 class DuplicateDetector:
     """
@@ -43,6 +120,14 @@ class DuplicateDetector:
           near-duplicate detection.
         - ``duplicate_time_window_days``: Maximum days between service dates for
           claims to be considered potential near-duplicates.
+        - ``duplicate_group_keys``: Order of the patient/provider keys used to
+          group near-duplicate candidates.
+
+    Raises
+    ------
+    ValueError
+        If ``duplicate_group_keys`` is not an ordering of ``patient_id`` and
+        ``provider_id``.
 
     Examples
     --------
@@ -52,6 +137,10 @@ class DuplicateDetector:
     """
 
     def __init__(self, spark: SparkSession, config: DetectionConfig) -> None:
+        # The keys only set the grouping order; any other pair would silently pair
+        # claims across providers or never pair them at all
+        if sorted(config.duplicate_group_keys) != ["patient_id", "provider_id"]:
+            raise ValueError(f"duplicate_group_keys must order patient_id and provider_id, got {config.duplicate_group_keys!r}")
         self.spark = spark
         self.config = config
 
@@ -63,6 +152,13 @@ class DuplicateDetector:
         results into unified duplicate flags. A claim is marked as duplicate if
         it matches either criterion.
 
+        Unless the input is already cached, a projection of it owned by this call
+        is persisted for the duration of the pipeline, and the result is
+        materialized with a local checkpoint before that cache is released. A
+        cache the caller holds on ``claims`` is read through and left in place.
+        With ``config.materialize_duplicates`` off, nothing is persisted and the
+        result is returned lazily; caching is then left to the caller.
+
         Parameters
         ----------
         claims : DataFrame
@@ -79,15 +175,25 @@ class DuplicateDetector:
             - ``is_exact_duplicate`` : bool - True if exact field match.
             - ``is_near_duplicate`` : bool - True if similarity-based match.
         """
-        claims = self._detect_exact_duplicates(claims)
-        claims = self._detect_near_duplicates(claims)
-
-        claims = claims.withColumn(
+        # Exact and near-duplicate detection each read the claims; persist them so the
+        # upstream rule/statistics lineage is evaluated once rather than per read. The
+        # select gives this call its own plan to persist and release, since
+        # coerce_claim_types returns typed input unchanged and unpersisting that would
+        # drop the caller's cache
+        claims = coerce_claim_types(claims)
+        owns_cache = self.config.materialize_duplicates and not claims.is_cached
+        if owns_cache:
+            claims = claims.select(*claims.columns).persist(StorageLevel.MEMORY_AND_DISK)
+
+        result = self._detect_exact_duplicates(claims)
+        result = self._detect_near_duplicates(result)
+
+        result = result.withColumn(
             "is_duplicate",
             F.col("is_exact_duplicate") | F.col("is_near_duplicate"),
         )
 
-        claims = claims.withColumn(
+        result = result.withColumn(
             "duplicate_of",
             F.coalesce(
                 F.col("exact_duplicate_of"),
@@ -95,16 +201,22 @@ class DuplicateDetector:
             ),
         )
 
-        return claims
+        if not self.config.materialize_duplicates:
+            return result
+
+        if not owns_cache:
+            return result.localCheckpoint(eager=True)
+
+        return checkpoint_and_release(result, claims)
 
     def _detect_exact_duplicates(self, claims: DataFrame) -> DataFrame:
         """
         Identify claims with identical key fields.
 
-        Creates a composite key from patient, provider, procedure, date, and amount,
-        then uses window functions to find and rank duplicates within each key group.
-        The first claim (by claim_id order) is considered the original; subsequent
-        claims are flagged as duplicates.
+        Groups claims on a struct of patient, provider, procedure, date, and amount,
+        then aggregates each repeated key to its smallest claim_id. That first claim
+        is considered the original; the other claims in the group are flagged as
+        duplicates.
 
         Parameters
         ----------
@@ -118,8 +230,7 @@ class DuplicateDetector:
 
             - ``is_exact_duplicate`` : bool - True for duplicates (not the first occurrence).
             - ``exact_duplicate_of`` : str - claim_id of the first claim in the duplicate group.
-            - ``duplicate_key`` : str - Composite key used for matching.
-            - ``duplicate_rank`` : int - Position within duplicate group (1 = original).
+            - ``first_claim_in_group`` : str - Smallest claim_id sharing the key, null for unique keys.
         """
         key_fields = [
             "patient_id",
@@ -129,26 +240,27 @@ class DuplicateDetector:
             "charge_amount",
         ]
 
-        claims = claims.withColumn(
-            "duplicate_key",
-            F.concat_ws("|", *[F.col(c).cast("string") for c in key_fields]),
+        # Group on the typed key fields themselves: exact equality, so no hash
+        # collisions to guard against, and primitive comparisons per field
+        claims = claims.withColumn("duplicate_key", F.struct(*key_fields))
+
+        # Most keys are unique; keep only repeated ones so the join back carries a small
+        # table and claims without a match are simply not duplicates
+        first_claims = (
+            claims.groupBy("duplicate_key")
+            .agg(
+                F.count("*").alias("key_count"),
+                F.min("claim_id").alias("first_claim_in_group"),
+            )
+            .filter(F.col("key_count") > 1)
+            .drop("key_count")
         )
 
-        window = Window.partitionBy("duplicate_key").orderBy("claim_id")
-
-        claims = claims.withColumn(
-            "duplicate_rank",
-            F.row_number().over(window),
-        )
-
-        claims = claims.withColumn(
-            "first_claim_in_group",
-            F.first("claim_id").over(window),
-        )
+        claims = claims.join(first_claims, "duplicate_key", "left").drop("duplicate_key")
 
         claims = claims.withColumn(
             "is_exact_duplicate",
-            F.col("duplicate_rank") > 1,
+            F.coalesce(F.col("claim_id") != F.col("first_claim_in_group"), F.lit(False)),
         )
 
         claims = claims.withColumn(
@@ -165,8 +277,9 @@ class DuplicateDetector:
         """
         Identify highly similar claims that may indicate modified resubmissions.
 
-        Performs a self-join to compare claims from the same patient-provider pair
-        within a configurable time window. Calculates a weighted similarity score
+        Groups claims by patient-provider pair and date bucket and, within each
+        group, pairs every claim with the claims inside a configurable time window
+        using a sorted sweep rather than a self-join over the whole pair. Calculates a weighted similarity score
         based on procedure code match (60%) and charge amount similarity (40%).
         Claims exceeding the similarity threshold are flagged as near-duplicates.
 
@@ -200,49 +313,44 @@ class DuplicateDetector:
         """
         time_window_days = self.config.duplicate_time_window_days
 
-        claims_left = claims.alias("left")
-        claims_right = claims.alias("right")
-
-        join_condition = (
-            (F.col("left.patient_id") == F.col("right.patient_id"))
-            & (F.col("left.provider_id") == F.col("right.provider_id"))
-            & (F.col("left.claim_id") != F.col("right.claim_id"))
-            & (F.col("left.claim_id") > F.col("right.claim_id"))
-            & (F.abs(F.datediff(F.col("left.service_date"), F.col("right.service_date"))) <= time_window_days)
-            & (~F.col("left.is_exact_duplicate"))
-        )
-
-        potential_duplicates = claims_left.join(claims_right, join_condition, "left")
-
-        potential_duplicates = potential_duplicates.withColumn(
-            "procedure_match",
-            (F.col("left.procedure_code") == F.col("right.procedure_code")).cast("double"),
-        )
-
-        potential_duplicates = potential_duplicates.withColumn(
-            "charge_similarity",
-            F.lit(1.0)
-            - F.abs(F.col("left.charge_amount") - F.col("right.charge_amount"))
-            / F.greatest(F.col("left.charge_amount"), F.col("right.charge_amount")),
-        )
-
-        potential_duplicates = potential_duplicates.withColumn(
-            "similarity_score",
-            (F.col("procedure_match") * 0.6 + F.col("charge_similarity") * 0.4),
+        # A null in any compared field can never yield a similarity score, so
+        # those claims are dropped before pairing rather than inside each group.
+        # Exact duplicates are dropped too: they are never near-duplicates
+        # themselves, and any claim matching one matches its original equally
+        candidates = claims.filter(
+            ~F.col("is_exact_duplicate")
+            & F.col("claim_id").isNotNull()
+            & F.col("patient_id").isNotNull()
+            & F.col("provider_id").isNotNull()
+            & F.col("procedure_code").isNotNull()
+            & F.col("service_date").isNotNull()
+            & F.col("charge_amount").isNotNull()
+        ).select(
+            "patient_id",
+            "provider_id",
+            "claim_id",
+            F.unix_date("service_date").alias("service_day"),
+            "procedure_code",
+            F.col("charge_amount").cast("double").alias("charge_amount"),
         )
 
-        threshold = self.config.duplicate_similarity_threshold
-
-        near_duplicates = potential_duplicates.filter(F.col("similarity_score") >= threshold).select(
-            F.col("left.claim_id").alias("claim_id"),
-            F.col("right.claim_id").alias("near_duplicate_of"),
-            F.col("similarity_score"),
+        # Split each patient-provider pair into date buckets one window wide. Every
+        # claim is copied into its own bucket (as an anchor) and both neighbours, so
+        # each group holds all partners of its anchors and large pairs stay bounded
+        bucket_days = max(time_window_days, 1)
+        candidates = candidates.withColumn("own_bucket", F.floor(F.col("service_day") / F.lit(bucket_days)))
+        candidates = candidates.withColumn("date_bucket", F.explode(F.sequence(F.col("own_bucket") - 1, F.col("own_bucket") + 1)))
+        candidates = candidates.withColumn("is_anchor", F.col("date_bucket") == F.col("own_bucket")).drop("own_bucket")
+
+        near_duplicates = candidates.groupBy(*self.config.duplicate_group_keys, "date_bucket").applyInPandas(
+            partial(
+                _pairs_within_window,
+                window_days=time_window_days,
+                threshold=self.config.duplicate_similarity_threshold,
+            ),
+            schema=NEAR_DUPLICATE_PAIRS_SCHEMA,
         )
 
-        window = Window.partitionBy("claim_id").orderBy(F.desc("similarity_score"))
-
-        near_duplicates = near_duplicates.withColumn("rank", F.row_number().over(window)).filter(F.col("rank") == 1).drop("rank", "similarity_score")
-
         claims = claims.join(near_duplicates, "claim_id", "left")
 
         claims = claims.withColumn(
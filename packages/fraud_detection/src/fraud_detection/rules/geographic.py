@@ -17,9 +17,10 @@ detecting:
 
 from __future__ import annotations
 
+import math
 from typing import TYPE_CHECKING
 
-from pyspark.sql import DataFrame, Window
+from pyspark.sql import DataFrame
 from pyspark.sql import functions as F
 
 if TYPE_CHECKING:
@@ -27,6 +28,22 @@ if TYPE_CHECKING:
 
     from fraud_detection.detector import DetectionConfig
 
+COORDINATE_COLUMNS = ["patient_lat", "patient_lon", "provider_lat", "provider_lon"]
+
+# Earth's mean radius, used for all great-circle distances
+EARTH_RADIUS_MILES = 3959.0
+
+# One degree of great-circle arc on the 3,959-mile sphere is about 69.097 miles. A latitude
+# gap alone bounds the distance from below; the latitude plus longitude gap bounds it from
+# above. Rounding the scale down and up keeps both bounds strict.
+MILES_PER_DEGREE_FLOOR = 69.0
+MILES_PER_DEGREE_CEIL = 69.1
+
+# Below this distance limit, distance flags use the equirectangular approximation, which
+# stays within about 1% of the great-circle distance at that range (0.2% at contiguous-US
+# latitudes), so only pairs within a few miles of the limit can be flagged differently
+EQUIRECTANGULAR_MAX_MILES = 500.0
+
 
 class GeographicRules:
     """
@@ -80,32 +97,102 @@ class GeographicRules:
         Returns
         -------
         DataFrame
-            Claims with added columns:
+            Claims with the coordinate columns (if present) cast to float and added columns:
 
             - ``distance_miles`` : float - Calculated distance (if coordinates available).
             - ``distance_exceeded`` : bool - True if distance exceeds configured maximum.
         """
-        has_coordinates = all(col in claims.columns for col in ["patient_lat", "patient_lon", "provider_lat", "provider_lon"])
-
-        if has_coordinates:
-            claims = claims.withColumn(
-                "distance_miles",
-                self._haversine_distance(
-                    F.col("patient_lat"),
-                    F.col("patient_lon"),
-                    F.col("provider_lat"),
-                    F.col("provider_lon"),
-                ),
-            )
-
-            claims = claims.withColumn(
-                "distance_exceeded",
-                F.col("distance_miles") > F.lit(self.config.max_provider_patient_distance_miles),
-            )
+        return claims.withColumns(self.distance_columns(claims))
+
+    def apply_all(self, claims: DataFrame) -> DataFrame:
+        """
+        Run the distance and state mismatch checks together.
+
+        Equivalent to :meth:`check_provider_patient_distance` followed by
+        :meth:`check_state_mismatch`, but evaluates both in one projection.
+
+        Parameters
+        ----------
+        claims : DataFrame
+            Input claims, with coordinate and state columns where available.
+
+        Returns
+        -------
+        DataFrame
+            Claims with all columns added by the two individual checks.
+        """
+        return claims.withColumns({**self.distance_columns(claims), "state_mismatch": self.state_mismatch_expr(claims)})
+
+    def distance_columns(self, claims: DataFrame, *, include_distance: bool = True) -> dict[str, F.Column]:
+        """
+        Build the row-local distance expressions.
+
+        Exposed separately from :meth:`check_provider_patient_distance` so callers
+        can evaluate them in the same projection as other row-local flags.
+
+        Parameters
+        ----------
+        claims : DataFrame
+            Claims the expressions will be evaluated against; only its columns are inspected.
+        include_distance : bool, optional
+            Whether to include ``distance_miles``, by default True. Without it,
+            ``distance_exceeded`` only measures pairs the coordinate-gap bounds
+            cannot decide: with the equirectangular approximation for limits
+            under ``EQUIRECTANGULAR_MAX_MILES``, otherwise by comparing the
+            haversine term against the threshold directly.
+
+        Returns
+        -------
+        dict of str to Column
+            The coordinate columns cast to float, ``distance_miles`` (optional)
+            and ``distance_exceeded`` if all coordinates are present;
+            otherwise only a constant False ``distance_exceeded``.
+        """
+        if not all(col in claims.columns for col in COORDINATE_COLUMNS):
+            return {"distance_exceeded": F.lit(False)}
+
+        # Single precision resolves about a metre at these magnitudes, far inside the
+        # spherical-earth error, and halves the coordinates' width in later shuffles
+        coordinates = {c: F.col(c).cast("float") for c in COORDINATE_COLUMNS}
+
+        endpoints = (
+            coordinates["patient_lat"],
+            coordinates["patient_lon"],
+            coordinates["provider_lat"],
+            coordinates["provider_lon"],
+        )
+        max_miles = self.config.max_provider_patient_distance_miles
+
+        if include_distance:
+            distance = self._haversine_distance(*endpoints)
+            # Subexpression elimination evaluates the shared distance once per row
+            return {
+                **coordinates,
+                "distance_miles": distance,
+                "distance_exceeded": distance > F.lit(max_miles),
+            }
+
+        # The threshold is fixed per config, so it is converted once here into degree gaps
+        # and a haversine term: distance > max exactly when the term exceeds sin^2(max / 2R),
+        # which saves the per-row asin and sqrt. Thresholds beyond half the circumference
+        # clamp to a term of 1, which nothing exceeds.
+        max_term = math.sin(min(max_miles / (2 * EARTH_RADIUS_MILES), math.pi / 2)) ** 2
+
+        # Pairs a whole latitude band apart, or within a few miles in both directions,
+        # are decided without the trigonometry; only the band in between needs it
+        lat_gap = F.abs(coordinates["patient_lat"] - coordinates["provider_lat"])
+        lon_gap = F.abs(coordinates["patient_lon"] - coordinates["provider_lon"])
+        if max_miles < EQUIRECTANGULAR_MAX_MILES:
+            undecided = self._equirectangular_distance(*endpoints) > F.lit(max_miles)
         else:
-            claims = claims.withColumn("distance_exceeded", F.lit(False))
+            undecided = self._haversine_term(*endpoints) > F.lit(max_term)
+        exceeded = (
+            F.when(lat_gap > F.lit(max_miles / MILES_PER_DEGREE_FLOOR), F.lit(True))
+            .when(lat_gap + lon_gap <= F.lit(max_miles / MILES_PER_DEGREE_CEIL), F.lit(False))
+            .otherwise(undecided)
+        )
 
-        return claims
+        return {**coordinates, "distance_exceeded": exceeded}
 
     def _haversine_distance(self, lat1: F.Column, lon1: F.Column, lat2: F.Column, lon2: F.Column) -> F.Column:
         """
@@ -136,17 +223,71 @@ class GeographicRules:
         Uses Earth's mean radius of 3,959 miles. Accuracy is typically within
         0.5% for most practical distances.
         """
-        earth_radius_miles = 3959.0
+        return EARTH_RADIUS_MILES * 2 * F.asin(F.sqrt(self._haversine_term(lat1, lon1, lat2, lon2)))
 
-        lat1_rad = F.radians(lat1)
-        lat2_rad = F.radians(lat2)
-        delta_lat = F.radians(lat2 - lat1)
-        delta_lon = F.radians(lon2 - lon1)
+    def _haversine_term(self, lat1: F.Column, lon1: F.Column, lat2: F.Column, lon2: F.Column) -> F.Column:
+        """
+        Calculate the haversine of the central angle between two points.
 
-        a = F.sin(delta_lat / 2) ** 2 + F.cos(lat1_rad) * F.cos(lat2_rad) * F.sin(delta_lon / 2) ** 2
-        c = 2 * F.asin(F.sqrt(a))
+        Parameters
+        ----------
+        lat1 : Column
+            Latitude of first point in degrees.
+        lon1 : Column
+            Longitude of first point in degrees.
+        lat2 : Column
+            Latitude of second point in degrees.
+        lon2 : Column
+            Longitude of second point in degrees.
+
+        Returns
+        -------
+        Column
+            ``sin^2(theta / 2)`` for central angle ``theta``, in [0, 1] and
+            increasing with distance.
+        """
+        # Half-angle sines are squared by multiplication; ``** 2`` compiles to a pow()
+        # call per row. Degrees are folded into the half-angle constant.
+        half_degree = math.pi / 360.0
+        sin_half_lat = F.sin((lat2 - lat1) * half_degree)
+        sin_half_lon = F.sin((lon2 - lon1) * half_degree)
+
+        return sin_half_lat * sin_half_lat + F.cos(F.radians(lat1)) * F.cos(F.radians(lat2)) * sin_half_lon * sin_half_lon
 
-        return earth_radius_miles * c
+    def _equirectangular_distance(self, lat1: F.Column, lon1: F.Column, lat2: F.Column, lon2: F.Column) -> F.Column:
+        """
+        Approximate the distance between two nearby points on a flat projection.
+
+        Scales the longitude gap by the cosine of the mean latitude and takes
+        the planar distance, needing one cosine and one square root per row.
+
+        Parameters
+        ----------
+        lat1 : Column
+            Latitude of first point in degrees.
+        lon1 : Column
+            Longitude of first point in degrees.
+        lat2 : Column
+            Latitude of second point in degrees.
+        lon2 : Column
+            Longitude of second point in degrees.
+
+        Returns
+        -------
+        Column
+            Approximate distance in miles between the two points.
+
+        Notes
+        -----
+        Within about 1% of :meth:`_haversine_distance` for points up to 500 miles
+        apart at US latitudes; the error grows with distance and latitude.
+        """
+        # Measure the longitude gap the short way round, for pairs straddling the antimeridian
+        raw_lon_gap = F.abs(lon2 - lon1)
+        lon_gap = F.least(raw_lon_gap, 360.0 - raw_lon_gap) * F.cos((lat1 + lat2) * (math.pi / 360.0))
+        lat_gap = lat2 - lat1
+
+        return EARTH_RADIUS_MILES * (math.pi / 180.0) * F.sqrt(lon_gap * lon_gap + lat_gap * lat_gap)
 
     def check_state_mismatch(self, claims: DataFrame) -> DataFrame:
         """
@@ -169,16 +310,41 @@ class GeographicRules:
 
             - ``state_mismatch`` : bool - True if patient and provider states differ.
         """
+        return claims.withColumn("state_mismatch", self.state_mismatch_expr(claims))
+
+    def state_mismatch_expr(self, claims: DataFrame) -> F.Column:
+        """
+        Build the row-local state mismatch expression.
+
+        Exposed separately from :meth:`check_state_mismatch` so callers can
+        evaluate it in the same projection as other row-local flags.
+
+        Parameters
+        ----------
+        claims : DataFrame
+            Claims the expression will be evaluated against; only its columns are inspected.
+
+        Returns
+        -------
+        Column
+            True if patient and provider states are both present and differ;
+            constant False if either state column is missing.
+
+        Notes
+        -----
+        When the claims carry ``patient_state_code`` / ``provider_state_code``
+        (see :func:`~fraud_detection.schema.encode_states`), the comparison is
+        made on those short integers, falling back to the strings only for rows
+        with an unrecognized state.
+        """
         if "patient_state" not in claims.columns or "provider_state" not in claims.columns:
-            claims = claims.withColumn("state_mismatch", F.lit(False))
-            return claims
+            return F.lit(False)
 
-        claims = claims.withColumn(
-            "state_mismatch",
-            (F.col("patient_state") != F.col("provider_state")) & F.col("patient_state").isNotNull() & F.col("provider_state").isNotNull(),
-        )
+        differs = F.col("patient_state") != F.col("provider_state")
+        if "patient_state_code" in claims.columns and "provider_state_code" in claims.columns:
+            differs = F.coalesce(F.col("patient_state_code") != F.col("provider_state_code"), differs)
 
-        return claims
+        return differs & F.col("patient_state").isNotNull() & F.col("provider_state").isNotNull()
 
     def check_geographic_clustering(self, claims: DataFrame) -> DataFrame:
         """
@@ -203,30 +369,29 @@ class GeographicRules:
         DataFrame
             Claims with added columns:
 
-            - ``unique_patient_states`` : int - Number of distinct states patients come from.
+            - ``unique_patient_states`` : int - Approximate number of distinct states patients
+              come from (HyperLogLog, ~2% relative error).
             - ``total_patients`` : int - Total patient count for this provider.
             - ``geographic_clustering_flag`` : bool - True if suspicious clustering detected.
         """
-        window = Window.partitionBy("provider_id")
-
-        claims = claims.withColumn(
-            "unique_patient_states",
-            F.size(F.collect_set("patient_state").over(window)),
-        )
-
-        claims = claims.withColumn(
-            "total_patients",
-            F.count("patient_id").over(window),
+        # Summarize patient states per provider and broadcast the summary onto the claims.
+        # The state count is a fixed-size sketch rather than a per-provider set; the flag
+        # itself needs an exact single-state test, which min == max gives without a set
+        provider_summary = claims.groupBy("provider_id").agg(
+            F.approx_count_distinct("patient_state", rsd=0.02).alias("unique_patient_states"),
+            F.count("patient_id").alias("total_patients"),
+            F.coalesce(F.min("patient_state") == F.max("patient_state"), F.lit(False)).alias("_single_patient_state"),
         )
+        claims = claims.join(F.broadcast(provider_summary), "provider_id", "left")
 
         claims = claims.withColumn(
             "geographic_clustering_flag",
-            (F.col("total_patients") > 100) & (F.col("unique_patient_states") == 1) & (F.col("patient_state") != F.col("provider_state")),
+            (F.col("total_patients") > 100) & F.col("_single_patient_state") & (F.col("patient_state") != F.col("provider_state")),
         )
 
-        return claims
+        return claims.drop("_single_patient_state")
 
-    def check_impossible_travel(self, claims: DataFrame) -> DataFrame:
+    def check_impossible_travel(self, claims: DataFrame, include_locations: bool = False) -> DataFrame:
         """
         Detect physically impossible travel patterns for patients.
 
@@ -240,14 +405,19 @@ class GeographicRules:
         claims : DataFrame
             Input claims with ``patient_id``, ``service_date``, and optionally
             ``provider_lat``, ``provider_lon`` for precise detection.
+        include_locations : bool, default False
+            If True, also collect the ``provider_lats`` / ``provider_lons`` arrays.
+            Off by default since the flag only needs the count.
 
         Returns
         -------
         DataFrame
             Claims with added columns:
 
-            - ``provider_locations`` : array<struct> - All provider coordinates visited same day.
-            - ``num_providers_same_day`` : int - Count of distinct provider locations.
+            - ``provider_lats``, ``provider_lons`` : array - Latitudes and longitudes of
+              all providers visited same day, index-aligned (only with ``include_locations``).
+            - ``num_providers_same_day`` : int - Count of distinct provider locations
+              (approximate, HyperLogLog).
             - ``impossible_travel_flag`` : bool - True if patient visited >3 providers same day.
 
         Notes
@@ -257,22 +427,28 @@ class GeographicRules:
         pairwise distances and required travel speeds, but this requires a UDF
         for efficient computation.
         """
-        required_cols = ["patient_lat", "patient_lon", "provider_lat", "provider_lon"]
-        if not all(col in claims.columns for col in required_cols):
+        if not all(col in claims.columns for col in COORDINATE_COLUMNS):
             claims = claims.withColumn("impossible_travel_flag", F.lit(False))
             return claims
 
-        window = Window.partitionBy("patient_id", "service_date")
-
-        claims = claims.withColumn(
-            "provider_locations",
-            F.collect_list(F.struct(F.col("provider_lat").alias("lat"), F.col("provider_lon").alias("lon"))).over(window),
-        )
-
-        claims = claims.withColumn(
-            "num_providers_same_day",
-            F.size("provider_locations"),
-        )
+        # A patient/day aggregate joined back rather than a window over the claims: the
+        # count (and location lists) are partially aggregated before the shuffle, so a
+        # heavily repeated key ships one partial per map task instead of all its rows,
+        # and AQE can split the join back if a key is still skewed
+        # Counting distinct locations needs only a small sketch, not the arrays themselves
+        aggregates = [F.approx_count_distinct(F.struct("provider_lat", "provider_lon")).alias("num_providers_same_day")]
+        if include_locations:
+            # Parallel arrays rather than an array of structs, so consumers of one coordinate
+            # read one contiguous array. Both lists are built in the same aggregate and skip
+            # the same rows (those missing either coordinate), which keeps them index-aligned.
+            located = F.col("provider_lat").isNotNull() & F.col("provider_lon").isNotNull()
+            aggregates += [
+                F.collect_list(F.when(located, F.col("provider_lat"))).alias("provider_lats"),
+                F.collect_list(F.when(located, F.col("provider_lon"))).alias("provider_lons"),
+            ]
+
+        patient_days = claims.groupBy("patient_id", "service_date").agg(*aggregates)
+        claims = claims.join(patient_days, ["patient_id", "service_date"], "left")
 
         claims = claims.withColumn(
             "impossible_travel_flag",
@@ -0,0 +1,119 @@
+"""Canonical schemas for claims data and fraud detection results."""
+
+from pyspark.sql import DataFrame
+from pyspark.sql import functions as F
+from pyspark.sql.types import (
+    BooleanType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    StringType,
+    StructField,
+    StructType,
+    TimestampType,
+)
+
+# Layout of raw claims files, in column order. Passing this to CSV/JSON readers
+# avoids the extra full pass over the input that ``inferSchema`` performs.
+CLAIMS_SCHEMA = StructType(
+    [
+        StructField("claim_id", StringType(), False),
+        StructField("patient_id", StringType(), False),
+        StructField("provider_id", StringType(), False),
+        StructField("provider_name", StringType(), True),
+        StructField("procedure_code", StringType(), False),
+        StructField("diagnosis_code", StringType(), True),
+        StructField("service_date", DateType(), False),
+        StructField("submitted_date", DateType(), True),
+        StructField("charge_amount", DecimalType(12, 2), False),
+        StructField("paid_amount", DecimalType(12, 2), True),
+        StructField("patient_state", StringType(), True),
+        StructField("provider_state", StringType(), True),
+        StructField("place_of_service", StringType(), True),
+    ]
+)
+
+# Layout of detection results once written as CSV, where array columns
+# (rule_violations, statistical_flags) have been flattened to strings.
+RESULTS_CSV_SCHEMA = StructType(
+    [
+        StructField("claim_id", StringType(), False),
+        StructField("patient_id", StringType(), True),
+        StructField("provider_id", StringType(), True),
+        StructField("charge_amount", DecimalType(12, 2), True),
+        StructField("fraud_score", DoubleType(), True),
+        StructField("fraud_reasons", StringType(), True),
+        StructField("rule_violations", StringType(), True),
+        StructField("statistical_flags", StringType(), True),
+        StructField("is_duplicate", BooleanType(), True),
+        StructField("duplicate_of", StringType(), True),
+        StructField("processed_at", TimestampType(), True),
+    ]
+)
+
+# Dense small-integer codes for US state abbreviations (50 states, DC and Puerto Rico),
+# so state columns can be compared and shuffled as 2-byte integers instead of strings.
+STATE_CODES: dict[str, int] = {
+    state: code
+    for code, state in enumerate(
+        "AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO "
+        "MT NE NV NH NJ NM NY NC ND OH OK OR PA PR RI SC SD TN TX UT VT VA WA WV WI WY".split(),
+        start=1,
+    )
+}
+
+
+def coerce_claim_types(claims: DataFrame) -> DataFrame:
+    """
+    Cast string-typed ``service_date`` and ``charge_amount`` to their canonical types.
+
+    Claims read from CSV or JSON without a schema carry these columns as strings,
+    which every date and arithmetic expression would otherwise re-parse per row.
+    Columns that are missing or already typed are left alone, so the call is
+    cheap to repeat at each entry point.
+
+    Parameters
+    ----------
+    claims : DataFrame
+        Input claims.
+
+    Returns
+    -------
+    DataFrame
+        Claims with ``service_date`` as date and ``charge_amount`` as decimal(12,2).
+    """
+    casts = {
+        name: F.col(name).cast(CLAIMS_SCHEMA[name].dataType)
+        for name in ("service_date", "charge_amount")
+        if name in claims.columns and isinstance(claims.schema[name].dataType, StringType)
+    }
+    return claims.withColumns(casts) if casts else claims
+
+
+def encode_states(claims: DataFrame) -> DataFrame:
+    """
+    Add ``patient_state_code`` and ``provider_state_code`` columns from :data:`STATE_CODES`.
+
+    Intended to run once at ingest (before claims are staged or cached), so that
+    later state comparisons and shuffles work on short integers. Abbreviations
+    outside :data:`STATE_CODES` get a null code; state columns that are missing
+    are skipped.
+
+    Parameters
+    ----------
+    claims : DataFrame
+        Input claims with ``patient_state`` and/or ``provider_state`` columns.
+
+    Returns
+    -------
+    DataFrame
+        Claims with a smallint ``<column>_code`` for each state column present.
+    """
+    codes = F.create_map(*[F.lit(item) for pair in STATE_CODES.items() for item in pair])
+    return claims.withColumns(
+        {
+            f"{name}_code": codes[F.col(name)].cast("smallint")
+            for name in ("patient_state", "provider_state")
+            if name in claims.columns
+        }
+    )
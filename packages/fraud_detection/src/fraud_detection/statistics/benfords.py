@@ -92,6 +92,13 @@ class BenfordsLawAnalyzer:
 
     def __init__(self, spark: SparkSession) -> None:
         self.spark = spark
+        # Built once and broadcast at each join: nine rows never warrant a shuffle. The
+        # explicit schema skips type inference and keeps the digit an int, matching
+        # _first_digit on the claims side so the join key needs no widening cast.
+        self.expected_df = spark.createDataFrame(
+            list(self.BENFORDS_EXPECTED.items()),
+            "_first_digit int, _expected_freq double",
+        )
 
     def analyze(
         self,
@@ -130,16 +137,14 @@ class BenfordsLawAnalyzer:
 
             - ``benfords_anomaly`` : bool - True if the value's first digit
               is over-represented in the dataset, suggesting possible fabrication.
-        """
-        df = df.withColumn(
-            "_first_digit",
-            F.substring(F.abs(F.col(column)).cast("string"), 1, 1).cast("int"),
-        )
 
-        df = df.withColumn(
-            "_first_digit",
-            F.when((F.col("_first_digit") > 0) & (F.col("_first_digit") <= 9), F.col("_first_digit")),
-        )
+        Notes
+        -----
+        A ``_first_digit`` column already present (from :meth:`first_digit_columns`
+        for the same ``column``, evaluated in an earlier projection) is reused.
+        """
+        if "_first_digit" not in df.columns:
+            df = df.withColumns(self.first_digit_columns(column))
 
         if group_by:
             df = self._analyze_by_group(df, group_by, threshold)
@@ -150,6 +155,47 @@ class BenfordsLawAnalyzer:
 
         return df
 
+    def first_digit_columns(self, column: str) -> dict[str, F.Column]:
+        """
+        Build the row-local leading-digit expression used by :meth:`analyze`.
+
+        Exposed so callers can evaluate it in the same projection as other
+        row-local flags; :meth:`analyze` drops the column when it is done.
+
+        Parameters
+        ----------
+        column : str
+            Name of the numeric column that will be analyzed.
+
+        Returns
+        -------
+        dict of str to Column
+            ``_first_digit`` mapped to the leading digit of ``column``.
+        """
+        return {"_first_digit": self._first_digit(column)}
+
+    @staticmethod
+    def _first_digit(column: str) -> F.Column:
+        """
+        Build the leading-digit expression for a numeric column.
+
+        Scales the absolute value by its power of ten rather than formatting
+        it as a string and parsing the first character back.
+
+        Parameters
+        ----------
+        column : str
+            Name of the numeric column.
+
+        Returns
+        -------
+        Column
+            Leading digit (1-9) of ``abs(column)``; null for values below 1
+            (whose written form starts with 0) and for nulls.
+        """
+        value = F.abs(F.col(column).cast("double"))
+        return F.when(value >= 1, F.floor(value / F.pow(F.lit(10.0), F.floor(F.log10(value)))).cast("int"))
+
     def _analyze_by_group(self, df: DataFrame, group_by: str, threshold: float) -> DataFrame:
         """
         Perform Benford's Law analysis separately for each group.
@@ -173,30 +219,19 @@ class BenfordsLawAnalyzer:
         DataFrame
             DataFrame with ``benfords_anomaly`` column added.
         """
-        digit_counts = df.filter(F.col("_first_digit").isNotNull()).groupBy(group_by, "_first_digit").count()
-
-        totals = digit_counts.groupBy(group_by).agg(F.sum("count").alias("_total"))
-
-        digit_counts = digit_counts.join(totals, group_by)
-
-        digit_counts = digit_counts.withColumn("_observed_freq", F.col("count") / F.col("_total"))
-
-        expected_df = self.spark.createDataFrame(  # type: ignore[arg-type]
-            list(self.BENFORDS_EXPECTED.items()),
-            ["_first_digit", "_expected_freq"],
-        )
-
-        digit_counts = digit_counts.join(expected_df, "_first_digit")
-
-        digit_counts = digit_counts.withColumn(
-            "_deviation",
-            F.abs(F.col("_observed_freq") - F.col("_expected_freq")),
-        )
-
-        group_deviations = digit_counts.groupBy(group_by).agg(
-            F.max("_deviation").alias("_max_benford_deviation"),
-            F.avg("_deviation").alias("_avg_benford_deviation"),
-        )
+        # One pass per group: each digit's share is a conditional count over the group's
+        # total, compared against its expected frequency inlined as a literal. Digits that
+        # never occur in a group stay null, so only observed digits are compared.
+        first_digit = F.col("_first_digit")
+        total = F.count(first_digit)
+        deviations = [
+            F.when(F.count_if(first_digit == digit) > 0, F.abs(F.count_if(first_digit == digit) / total - F.lit(expected)))
+            for digit, expected in self.BENFORDS_EXPECTED.items()
+        ]
+
+        # Values without a leading digit (nulls, |value| < 1) are dropped before the
+        # aggregate; they still receive their group's flag through the join below
+        group_deviations = df.filter(first_digit.isNotNull()).groupBy(group_by).agg(F.greatest(*deviations).alias("_max_benford_deviation"))
 
         group_deviations = group_deviations.withColumn(
             "benfords_anomaly_group",
@@ -240,39 +275,47 @@ class BenfordsLawAnalyzer:
         """
         digit_counts = df.filter(F.col("_first_digit").isNotNull()).groupBy("_first_digit").count()
 
-        total_first = digit_counts.agg(F.sum("count")).first()
-        if not total_first:
-            raise ValueError("No valid data to analyze")
-        total = total_first[0]
+        # The one-row total and the flagged-digit mask stay on the executors as broadcast
+        # joins rather than being collected to the driver
+        total = digit_counts.agg(F.sum("count").alias("_total"))
 
-        digit_counts = digit_counts.withColumn("_observed_freq", F.col("count") / F.lit(total))
+        digit_counts = digit_counts.crossJoin(F.broadcast(total))
 
-        expected_df = self.spark.createDataFrame(  # type: ignore[arg-type]
-            list(self.BENFORDS_EXPECTED.items()),
-            ["_first_digit", "_expected_freq"],
-        )
+        digit_counts = digit_counts.withColumn("_observed_freq", F.col("count") / F.col("_total"))
 
-        digit_counts = digit_counts.join(expected_df, "_first_digit")
+        digit_counts = digit_counts.join(F.broadcast(self.expected_df), "_first_digit")
 
         digit_counts = digit_counts.withColumn(
             "_deviation",
             F.abs(F.col("_observed_freq") - F.col("_expected_freq")),
         )
 
-        over_represented = (
-            digit_counts.filter((F.col("_observed_freq") > F.col("_expected_freq")) & (F.col("_deviation") > threshold))
-            .select("_first_digit")
-            .collect()
-        )
+        # Digits 1-9 fit in one int: bit d is set when digit d is over-represented, so each
+        # claim is tested with a shift and a mask instead of a join keyed on its digit
+        flagged_digits = digit_counts.filter((F.col("_observed_freq") > F.col("_expected_freq")) & (F.col("_deviation") > threshold))
+        flagged_mask = flagged_digits.agg(F.coalesce(F.bit_or(self._digit_bit()), F.lit(0)).alias("_benford_mask"))
 
-        flagged_digits = [row["_first_digit"] for row in over_represented]
+        df = df.crossJoin(F.broadcast(flagged_mask))
 
         df = df.withColumn(
             "benfords_anomaly",
-            F.col("_first_digit").isin(flagged_digits) if flagged_digits else F.lit(False),
+            F.coalesce(F.col("_benford_mask").bitwiseAND(self._digit_bit()) != 0, F.lit(False)),
         )
 
-        return df
+        return df.drop("_benford_mask")
+
+    @staticmethod
+    def _digit_bit() -> F.Column:
+        """
+        Build the single-bit mask for the ``_first_digit`` column.
+
+        Returns
+        -------
+        Column
+            ``1 << _first_digit``; null where the digit is null.
+        """
+        # functions.shiftleft only takes a literal shift before Spark 4, hence the SQL form
+        return F.expr("shiftleft(1, _first_digit)")
 
     def get_distribution_report(self, df: DataFrame, column: str, group_by: str | None = None) -> DataFrame:
         """
@@ -317,10 +360,7 @@ class BenfordsLawAnalyzer:
         |          2| 1755|10000|            0.1755|             0.176|  -0.0005|               -0.28|
         ...
         """
-        analysis_df = df.withColumn(
-            "first_digit",
-            F.substring(F.abs(F.col(column)).cast("string"), 1, 1).cast("int"),
-        ).filter((F.col("first_digit") > 0) & (F.col("first_digit") <= 9))
+        analysis_df = df.withColumn("first_digit", self._first_digit(column)).filter(F.col("first_digit").isNotNull())
 
         if group_by:
             digit_counts = analysis_df.groupBy(group_by, "first_digit").count()
@@ -339,12 +379,9 @@ class BenfordsLawAnalyzer:
             F.round(F.col("count") / F.col("total"), 4),
         )
 
-        expected_df = self.spark.createDataFrame(  # type: ignore[arg-type]
-            [(d, round(f, 4)) for d, f in self.BENFORDS_EXPECTED.items()],
-            ["first_digit", "expected_frequency"],
-        )
+        expected_df = self.expected_df.toDF("first_digit", "expected_frequency")
 
-        report = digit_counts.join(expected_df, "first_digit")
+        report = digit_counts.join(F.broadcast(expected_df), "first_digit")
 
         report = report.withColumn(
             "deviation",
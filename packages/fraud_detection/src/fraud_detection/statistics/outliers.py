@@ -20,16 +20,136 @@ Two primary statistical methods are implemented:
 
 from __future__ import annotations
 
+import logging
+from functools import partial
 from typing import TYPE_CHECKING
 
-from pyspark.sql import DataFrame, Row, Window
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
+from pyspark import StorageLevel
+from pyspark.sql import Column, DataFrame
 from pyspark.sql import functions as F
 
+from fraud_detection.utils.spark import checkpoint_and_release
+
 if TYPE_CHECKING:
     from pyspark.sql import SparkSession
 
     from fraud_detection.detector import DetectionConfig
 
+logger = logging.getLogger(__name__)
+
+ROLLING_BASELINE_SCHEMA = "provider_id string, _day int, _rolling_avg double"
+
+
+def _rolling_baseline(daily: pd.DataFrame, window_days: int) -> pd.DataFrame:
+    """
+    Compute each service day's trailing average charge for one provider.
+
+    Days are sorted so that the days in each trailing window form a contiguous
+    slice, located with a binary search; window sums then come from
+    differences of cumulative sums instead of re-adding every day.
+
+    Parameters
+    ----------
+    daily : pd.DataFrame
+        One provider's days with columns ``provider_id``, ``_day`` (days since
+        epoch), ``_charge_sum`` and ``_charge_count``.
+    window_days : int
+        Number of days before each day that make up its baseline.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per day with ``_rolling_avg``, the average charge over the
+        ``window_days`` days before it (excluding the day itself); NaN where
+        there are no charges in that range.
+    """
+    daily = daily.sort_values("_day", kind="stable")
+    days = daily["_day"].to_numpy()
+
+    cumulative_sum = np.concatenate(([0.0], np.cumsum(daily["_charge_sum"].fillna(0.0).to_numpy(dtype=np.float64))))
+    cumulative_count = np.concatenate(([0], np.cumsum(daily["_charge_count"].to_numpy(dtype=np.int64))))
+
+    start = np.searchsorted(days, days - window_days, side="left")
+    end = np.searchsorted(days, days, side="left")
+    counts = cumulative_count[end] - cumulative_count[start]
+    sums = cumulative_sum[end] - cumulative_sum[start]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_avg = np.where(counts > 0, sums / counts, np.nan)
+
+    return pd.DataFrame({"provider_id": daily["provider_id"].to_numpy(), "_day": days, "_rolling_avg": rolling_avg})
+
+
+def _attach_statistics(df: DataFrame, statistics: dict[str, Column], group_by: list[str] | None) -> tuple[DataFrame, dict[str, Column]]:
+    """
+    Compute aggregate statistics and make them available on every row of ``df``.
+
+    Parameters
+    ----------
+    df : DataFrame
+        Input DataFrame.
+    statistics : dict[str, Column]
+        Aggregate expressions by name, all computed in one aggregation.
+    group_by : list[str], optional
+        Columns to group by; the statistics are computed over the whole
+        DataFrame when omitted.
+
+    Returns
+    -------
+    tuple[DataFrame, dict[str, Column]]
+        ``df`` joined to the statistics (one row, or one row per group) and a
+        column for each statistic, by name.
+    """
+    aggregates = [expression.alias(name) for name, expression in statistics.items()]
+    references = {name: F.col(name) for name in statistics}
+
+    if group_by:
+        # Plain aggregates are partially computed on each task before the shuffle, so a
+        # dominant procedure code reaches the final aggregate as one row per task instead of
+        # landing whole on a single task, as it would under a window partitioned by the group;
+        # with one row per group, the statistics are broadcast back rather than shuffling the claims
+        stats = df.groupBy(group_by).agg(*aggregates)
+        return df.join(F.broadcast(stats), group_by, "left"), references
+
+    # A global window would move every row to a single partition. The one-row aggregate is
+    # broadcast to every task instead, which also keeps the result lazy: no job runs until the
+    # caller's action, where collecting the scalars first would run one at call time.
+    return df.crossJoin(F.broadcast(df.agg(*aggregates))), references
+
+
+def _zscore_flag(value: Column, mean: Column, stddev: Column, threshold: float) -> Column:
+    """Return whether ``value`` is more than ``threshold`` standard deviations from ``mean``."""
+    # |x - mean| / stddev > threshold as a signed range: two multiply-compares per row, no
+    # divide or abs. The stddev guard keeps rounding in the mean of identical values from
+    # flagging them; a null statistic or value gives False
+    deviation = value - mean
+    bound = threshold * stddev
+    return F.coalesce((stddev > 0) & ((deviation > bound) | (deviation < -bound)), F.lit(False))
+
+
+def _iqr_flag(value: Column, q1: Column, q3: Column, multiplier: float) -> Column:
+    """Return whether ``value`` lies more than ``multiplier`` interquartile ranges outside ``[q1, q3]``."""
+    iqr = q3 - q1
+    return (value < q1 - multiplier * iqr) | (value > q3 + multiplier * iqr)
+
+
+def _zscore_statistics(column: str) -> dict[str, Column]:
+    """Return the aggregates the z-score flag needs for ``column``."""
+    # Single-pass aggregates that Spark pre-aggregates on each task and merges with running
+    # moments, which stays accurate where sum-of-squares would cancel
+    return {"_mean": F.mean(column), "_stddev": F.stddev(column)}
+
+
+def _iqr_statistics(column: str) -> dict[str, Column]:
+    """Return the aggregates the IQR flag needs for ``column``."""
+    # Both quartiles come from one percentile sketch rather than one each; the two element
+    # lookups reference the same aggregate, which the planner evaluates once. Each lookup is
+    # null when the column has no non-null values.
+    quartiles = F.percentile_approx(column, [0.25, 0.75])
+    return {"_q1": quartiles[0], "_q3": quartiles[1]}
+
 
 class OutlierDetector:
     """
@@ -61,6 +181,47 @@ class OutlierDetector:
         self.spark = spark
         self.config = config
 
+        # Grouped statistics are keyed by procedure code, where a few common codes dominate;
+        # without AQE their shuffles keep a static partition count and skewed joins stay unsplit
+        if spark.conf.get("spark.sql.adaptive.enabled", "true").lower() != "true":
+            logger.warning("Adaptive query execution is disabled; grouped outlier statistics may be skewed by common procedure codes")
+
+    def detect_all(self, df: DataFrame) -> DataFrame:
+        """
+        Run the procedure, provider and temporal outlier checks together.
+
+        Equivalent to calling :meth:`detect_procedure_outliers`,
+        :meth:`detect_provider_outliers` and :meth:`detect_temporal_outliers`
+        in sequence. Each check reads the input more than once, so it is
+        persisted for the duration of the checks and the result is
+        materialized with a local checkpoint before the cache is released.
+        The input is hash-partitioned by procedure and provider before it is
+        persisted, so the provider check aggregates it and joins its
+        per-provider statistics back without shuffling the claims again.
+
+        Parameters
+        ----------
+        df : DataFrame
+            Input claims with ``provider_id``, ``procedure_code``,
+            ``service_date`` and ``charge_amount`` columns.
+
+        Returns
+        -------
+        DataFrame
+            Claims with all columns added by the three individual checks.
+        """
+        # Partitioning by procedure alone would put every claim of the dominant code in one
+        # partition; (procedure, provider) spreads them and still satisfies the provider
+        # check's grouping and join keys. The procedure statistics are broadcast either way;
+        # the temporal check is keyed by provider and day and is not helped.
+        df = df.repartition("procedure_code", "provider_id").persist(StorageLevel.MEMORY_AND_DISK)
+
+        result = self.detect_procedure_outliers(df)
+        result = self.detect_provider_outliers(result)
+        result = self.detect_temporal_outliers(result)
+
+        return checkpoint_and_release(result, df)
+
     def detect_zscore_outliers(
         self,
         df: DataFrame,
@@ -103,35 +264,16 @@ class OutlierDetector:
         -----
         The formula used is: ``z = (x - μ) / σ``
 
-        A claim is flagged if ``|z| > threshold``. When standard deviation is
-        zero (all values identical), Z-score is set to 0 to avoid division errors.
+        A claim is flagged if ``|z| > threshold``, evaluated without division as
+        ``x - μ > threshold * σ`` or ``x - μ < -threshold * σ``. When standard
+        deviation is zero (all values identical) or undefined (a single value),
+        no claim is flagged.
         """
-        threshold = self.config.outlier_zscore_threshold
-
-        if group_by:
-            window = Window.partitionBy(group_by)
-        else:
-            window = Window.partitionBy(F.lit(1))
-
-        df = df.withColumn(f"_{column}_mean", F.mean(column).over(window))
-        df = df.withColumn(f"_{column}_stddev", F.stddev(column).over(window))
-
-        df = df.withColumn(
-            f"_{column}_zscore",
-            F.when(
-                F.col(f"_{column}_stddev") > 0,
-                (F.col(column) - F.col(f"_{column}_mean")) / F.col(f"_{column}_stddev"),
-            ).otherwise(F.lit(0.0)),
-        )
-
-        df = df.withColumn(
-            output_column,
-            F.abs(F.col(f"_{column}_zscore")) > threshold,
-        )
+        flagged, stats = _attach_statistics(df, _zscore_statistics(column), group_by)
 
-        df = df.drop(f"_{column}_mean", f"_{column}_stddev", f"_{column}_zscore")
-
-        return df
+        # The z-score is inlined into the flag instead of kept as a column
+        flag = _zscore_flag(F.col(column), stats["_mean"], stats["_stddev"], self.config.outlier_zscore_threshold)
+        return flagged.select(*df.columns, flag.alias(output_column))
 
     def detect_iqr_outliers(
         self,
@@ -176,39 +318,55 @@ class OutlierDetector:
         - 1.5: Standard outliers (Tukey's method)
         - 3.0: Extreme outliers only
         """
-        multiplier = self.config.outlier_iqr_multiplier
-
-        if group_by:
-            percentiles_df = df.groupBy(group_by).agg(
-                F.percentile_approx(column, 0.25).alias("_q1"),
-                F.percentile_approx(column, 0.75).alias("_q3"),
-            )
-            df = df.join(percentiles_df, group_by, "left")
-        else:
-
-            select_first: Row | None = df.select(
-                F.percentile_approx(column, 0.25),
-                F.percentile_approx(column, 0.75),
-            ).first()
-            if not select_first:
-                raise ValueError("No data to calculate percentiles")
-            q1: float = select_first[0]
-            q3: float = select_first[1]
-            df = df.withColumn("_q1", F.lit(q1))
-            df = df.withColumn("_q3", F.lit(q3))
-
-        df = df.withColumn("_iqr", F.col("_q3") - F.col("_q1"))
-        df = df.withColumn("_lower_bound", F.col("_q1") - (multiplier * F.col("_iqr")))
-        df = df.withColumn("_upper_bound", F.col("_q3") + (multiplier * F.col("_iqr")))
-
-        df = df.withColumn(
-            output_column,
-            (F.col(column) < F.col("_lower_bound")) | (F.col(column) > F.col("_upper_bound")),
-        )
+        flagged, stats = _attach_statistics(df, _iqr_statistics(column), group_by)
 
-        df = df.drop("_q1", "_q3", "_iqr", "_lower_bound", "_upper_bound")
+        # The bounds are inlined into the flag, in a single projection that also drops the quartiles
+        flag = _iqr_flag(F.col(column), stats["_q1"], stats["_q3"], self.config.outlier_iqr_multiplier)
+        return flagged.select(*df.columns, flag.alias(output_column))
 
-        return df
+    def detect_zscore_and_iqr_outliers(
+        self,
+        df: DataFrame,
+        column: str,
+        zscore_column: str,
+        iqr_column: str,
+        group_by: list[str] | None = None,
+    ) -> DataFrame:
+        """
+        Identify outliers with both the Z-score and IQR methods in one pass.
+
+        Equivalent to :meth:`detect_zscore_outliers` followed by
+        :meth:`detect_iqr_outliers` on the same column, but the mean, standard
+        deviation and quartiles are computed by a single aggregation (and, when
+        grouped, joined back once), so the input is scanned once rather than twice.
+
+        Parameters
+        ----------
+        df : DataFrame
+            Input DataFrame containing the column to analyze.
+        column : str
+            Name of the numeric column to check for outliers.
+        zscore_column : str
+            Name for the Z-score boolean flag column to be added.
+        iqr_column : str
+            Name for the IQR boolean flag column to be added.
+        group_by : list[str], optional
+            Columns to partition by for group-wise statistics.
+
+        Returns
+        -------
+        DataFrame
+            Input DataFrame with added boolean columns ``zscore_column`` and
+            ``iqr_column``.
+        """
+        flagged, stats = _attach_statistics(df, {**_zscore_statistics(column), **_iqr_statistics(column)}, group_by)
+
+        value = F.col(column)
+        return flagged.select(
+            *df.columns,
+            _zscore_flag(value, stats["_mean"], stats["_stddev"], self.config.outlier_zscore_threshold).alias(zscore_column),
+            _iqr_flag(value, stats["_q1"], stats["_q3"], self.config.outlier_iqr_multiplier).alias(iqr_column),
+        )
 
     def detect_procedure_outliers(
         self,
@@ -232,7 +390,9 @@ class OutlierDetector:
         charge_column : str, default "charge_amount"
             Column containing charge amounts.
         procedure_column : str, default "procedure_code"
-            Column containing procedure codes for grouping.
+            Column containing procedure codes for grouping. An integer code
+            column (one per procedure) gives the same groups and is cheaper
+            to hash and shuffle than the string code.
 
         Returns
         -------
@@ -273,7 +433,8 @@ class OutlierDetector:
         provider_column : str, default "provider_id"
             Column containing provider identifiers.
         procedure_column : str, default "procedure_code"
-            Column containing procedure codes.
+            Column containing procedure codes; may be an integer code column
+            as for :meth:`detect_procedure_outliers`.
 
         Returns
         -------
@@ -287,38 +448,32 @@ class OutlierDetector:
         provider_avg = df.groupBy(provider_column, procedure_column).agg(
             F.avg(charge_column).alias("provider_avg_charge"),
             F.count("*").alias("provider_procedure_count"),
+            F.sum(charge_column).alias("_charge_sum"),
+            F.count(charge_column).alias("_charge_count"),
         )
 
-        market_avg = df.groupBy(procedure_column).agg(
-            F.avg(charge_column).alias("market_avg_charge"),
-            F.stddev(charge_column).alias("market_stddev_charge"),
-        )
-
-        combined = provider_avg.join(market_avg, procedure_column)
-
-        combined = combined.withColumn(
-            "charge_deviation_ratio",
-            F.when(F.col("market_avg_charge") > 0, F.col("provider_avg_charge") / F.col("market_avg_charge")).otherwise(F.lit(1.0)),
-        )
-
-        combined = combined.withColumn(
-            "provider_billing_outlier",
-            (F.col("charge_deviation_ratio") > 2.0) | (F.col("charge_deviation_ratio") < 0.5),
+        # Market averages are rolled up from the provider partials rather than re-scanning
+        # and re-shuffling the claims; the sum is null exactly when the count is zero
+        market_avg = provider_avg.groupBy(procedure_column).agg(
+            (F.sum("_charge_sum") / F.sum("_charge_count")).alias("market_avg_charge"),
         )
 
-        df = df.join(
-            combined.select(
-                provider_column,
-                procedure_column,
-                "provider_avg_charge",
-                "charge_deviation_ratio",
-                "provider_billing_outlier",
-            ),
-            [provider_column, procedure_column],
-            "left",
+        # The market side has one row per procedure and is always broadcast. The combined
+        # provider x procedure table can be large, so its join back to the claims is left
+        # to AQE, which broadcasts it at runtime when it fits the broadcast threshold.
+        ratio = F.when(
+            F.col("market_avg_charge") > 0,
+            F.col("provider_avg_charge") / F.col("market_avg_charge"),
+        ).otherwise(F.lit(1.0))
+        combined = provider_avg.join(F.broadcast(market_avg), procedure_column).select(
+            provider_column,
+            procedure_column,
+            "provider_avg_charge",
+            ratio.alias("charge_deviation_ratio"),
+            ((ratio > 2.0) | (ratio < 0.5)).alias("provider_billing_outlier"),
         )
 
-        return df
+        return df.join(combined, [provider_column, procedure_column], "left")
 
     def detect_temporal_outliers(
         self,
@@ -333,8 +488,8 @@ class OutlierDetector:
         provider's recent historical average. Sudden unexplained billing
         increases may indicate the start of a fraud scheme.
 
-        Uses a 4-week rolling average as the baseline and flags charges
-        exceeding 3x this average.
+        Uses the provider's average charge over the preceding 4 weeks as the
+        baseline and flags charges exceeding 3x this average.
 
         Parameters
         ----------
@@ -354,28 +509,29 @@ class OutlierDetector:
 
         Notes
         -----
-        The rolling window looks at the previous 4 weeks of data for each
-        provider. Claims in the first 4 weeks of a provider's history will
-        not have a baseline for comparison and will not be flagged.
+        The rolling window covers the provider's claims in the 28 days before
+        each claim's service date, not including that date. Claims on a
+        provider's first service date, or after a gap of more than 28 days,
+        have no baseline for comparison and will not be flagged.
         """
-        df = df.withColumn("_week", F.weekofyear(date_column))
-        df = df.withColumn("_year", F.year(date_column))
-
-        window = Window.partitionBy("provider_id").orderBy("_year", "_week")
-
-        df = df.withColumn(
-            "_rolling_avg",
-            F.avg(charge_column).over(window.rowsBetween(-4, -1)),
+        # Claims are summed per provider and day first, so each provider's rolling pass
+        # sees one narrow row per service day instead of every claim; the baselines are
+        # joined back on (provider, day)
+        claims = df.withColumn("_day", F.unix_date(F.col(date_column).cast("date")))
+
+        daily = claims.groupBy("provider_id", "_day").agg(
+            F.sum(charge_column).cast("double").alias("_charge_sum"),
+            F.count(charge_column).alias("_charge_count"),
         )
-
-        df = df.withColumn(
-            "temporal_spike_flag",
-            F.when(
-                F.col("_rolling_avg").isNotNull() & (F.col("_rolling_avg") > 0),
-                F.col(charge_column) > (3 * F.col("_rolling_avg")),
-            ).otherwise(F.lit(False)),
+        baselines = daily.groupBy("provider_id").applyInPandas(
+            partial(_rolling_baseline, window_days=28),
+            schema=ROLLING_BASELINE_SCHEMA,
         )
 
-        df = df.drop("_week", "_year", "_rolling_avg")
-
-        return df
+        rolling_avg = F.col("_rolling_avg")
+        return claims.join(baselines, ["provider_id", "_day"], "left").select(
+            *df.columns,
+            F.when(rolling_avg.isNotNull() & (rolling_avg > 0), F.col(charge_column) > 3 * rolling_avg)
+            .otherwise(F.lit(False))
+            .alias("temporal_spike_flag"),
+        )
@@ -0,0 +1,83 @@
+"""Helpers for reading claims data in the supported file formats."""
+
+import logging
+
+from pyspark.sql import DataFrame, SparkSession
+
+from fraud_detection.schema import CLAIMS_SCHEMA, encode_states
+
+logger = logging.getLogger(__name__)
+
+
+def read_claims(
+    spark: SparkSession,
+    path: str,
+    /,
+    *,
+    fmt: str = "parquet",
+    staging_path: str | None = None,
+) -> DataFrame:
+    """
+    Read claims data from ``path``.
+
+    CSV and JSON inputs are parsed with the canonical claims schema rather than
+    ``inferSchema``, which would cost an extra full pass over the input. Parquet
+    inputs carry their own schema.
+
+    Parameters
+    ----------
+    spark : SparkSession
+        Active Spark session.
+    path : str
+        Location of the claims data.
+    fmt : str, optional
+        One of ``"parquet"``, ``"csv"`` or ``"json"``, by default ``"parquet"``.
+    staging_path : str, optional
+        If given and ``fmt`` is ``"csv"`` or ``"json"``, the parsed claims are
+        staged once through :func:`prepare_claims`, so downstream stages scan a
+        columnar file instead of re-parsing text.
+
+    Returns
+    -------
+    DataFrame
+        Claims DataFrame.
+    """
+    if fmt == "parquet":
+        return spark.read.parquet(path)
+
+    if fmt == "json":
+        claims = spark.read.schema(CLAIMS_SCHEMA).json(path)
+    else:
+        claims = spark.read.option("header", "true").schema(CLAIMS_SCHEMA).csv(path)
+
+    if staging_path is None:
+        return claims
+
+    return prepare_claims(claims, staging_path)
+
+
+def prepare_claims(claims: DataFrame, path: str, /) -> DataFrame:
+    """
+    Write claims once to Parquet at ``path`` and return them re-read from there.
+
+    Every rule and analyzer scans the claims again; against a Parquet copy each
+    scan reads only the columns it references, with filters pushed down to the
+    row groups. Low-cardinality columns such as the states are dictionary and
+    RLE encoded by the Parquet writer, and are also encoded to small integer
+    codes on the way (see :func:`~fraud_detection.schema.encode_states`).
+
+    Parameters
+    ----------
+    claims : DataFrame
+        Claims to stage, typically parsed from CSV or JSON.
+    path : str
+        Location for the staged Parquet files; overwritten if present.
+
+    Returns
+    -------
+    DataFrame
+        Claims read back from the staged Parquet files.
+    """
+    logger.info("Staging claims as Parquet at %s", path)
+    encode_states(claims).write.mode("overwrite").parquet(path)
+    return claims.sparkSession.read.parquet(path)
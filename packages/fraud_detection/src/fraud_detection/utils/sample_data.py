@@ -9,12 +9,14 @@ systems (CPT procedure codes, ICD-10 diagnosis codes, CMS place of service codes
 
 import logging
 import random
-import string
-from datetime import date, timedelta
-from decimal import Decimal
+from datetime import date
+from itertools import count
 
-from pyspark.sql import SparkSession
-from pyspark.sql.types import DateType, DecimalType, StringType, StructField, StructType
+from pyspark.sql import Column
+from pyspark.sql import functions as F
+
+from fraud_detection.schema import CLAIMS_SCHEMA, encode_states
+from fraud_detection.utils.spark import create_spark_session
 
 logger = logging.getLogger(__name__)
 
@@ -136,123 +138,49 @@ PLACES_OF_SERVICE = [
 ]
 
 
-def generate_id(prefix: str, /, *, length: int = 10) -> str:
-    """
-    Generate a random alphanumeric identifier with a prefix.
+# Charges used by the round-amount fraud pattern
+ROUND_CHARGES = [100, 200, 500, 1000, 1500, 2000]
 
-    Parameters
-    ----------
-    prefix : str
-        Prefix to prepend to the generated ID (e.g., "CLM", "PAT", "PRV").
-    length : int, optional
-        Number of random characters to generate, by default 10.
+# Fraud patterns, drawn uniformly for each fraudulent claim
+INFLATED_CHARGE, ROUND_AMOUNT, DUPLICATE_SETUP, WRONG_STATE = range(4)
 
-    Returns
-    -------
-    str
-        A string in the format "{prefix}{random_chars}".
 
-    Examples
-    --------
-    >>> generate_id("CLM", length=6)
-    'CLMAB3X9K2'
-    """
-    chars = string.ascii_uppercase + string.digits
-    return f"{prefix}{''.join(random.choices(chars, k=length))}"
+def _lookup(values: list[str] | list[int], index: Column) -> Column:
+    """Return the element of ``values`` at the zero-based ``index`` column."""
+    return F.element_at(F.array(*[F.lit(value) for value in values]), index.cast("int") + 1)
 
 
-def generate_claim(
-    claim_id: str,
-    patient_id: str,
-    provider_id: str,
-    provider_state: str,
-    base_date: date,
-    /,
-    *,
-    is_fraudulent: bool = False,
-) -> dict[str, str | date | Decimal]:
+def _random_index(size: int, seed: int) -> Column:
+    """Return a uniform random integer column in ``[0, size)``."""
+    return F.floor(F.rand(seed) * size).cast("int")
+
+
+def generate_id(prefix: str, salt: int, *keys: Column, length: int = 10) -> Column:
     """
-    Generate a single synthetic insurance claim record.
+    Derive a pseudo-random alphanumeric identifier with a prefix from key columns.
 
-    Creates a claim with realistic procedure codes, charges, dates, and
-    geographic data. Fraudulent claims are modified to exhibit detectable
-    patterns such as inflated charges, suspiciously round amounts, or
-    patient-provider state mismatches.
+    The same keys and salt always give the same identifier, so pools of patients
+    and providers can be drawn as integer ordinals and named per row without
+    collecting the pool on the driver.
 
     Parameters
     ----------
-    claim_id : str
-        Unique identifier for the claim.
-    patient_id : str
-        Identifier for the patient associated with the claim.
-    provider_id : str
-        Identifier for the healthcare provider submitting the claim.
-    provider_state : str
-        Two-letter US state code where the provider is located.
-    base_date : date
-        Reference date for generating service and submission dates.
-        Service dates are randomly distributed within 365 days before this date.
-    is_fraudulent : bool, optional
-        If True, applies one of several fraud patterns to the claim,
-        by default False.
+    prefix : str
+        Prefix to prepend to the identifier (e.g., "CLM", "PAT", "PRV").
+    salt : int
+        Per-run salt, so separate runs produce different identifiers.
+    *keys : Column
+        Columns identifying the entity.
+    length : int, optional
+        Number of hexadecimal characters after the prefix, by default 10.
 
     Returns
     -------
-    dict
-        Claim record with keys: claim_id, patient_id, provider_id, provider_name,
-        procedure_code, diagnosis_code, service_date, submitted_date,
-        charge_amount, paid_amount, patient_state, provider_state, place_of_service.
+    Column
+        String column in the format "{prefix}{random_chars}".
     """
-    procedure = random.choice(PROCEDURE_CODES)
-    min_charge, max_charge = PROCEDURE_CHARGES[procedure]
-
-    if is_fraudulent:
-        # Fraudulent claim modifications
-        fraud_type = random.choice(
-            [
-                "inflated_charge",
-                "round_amount",
-                "duplicate_setup",
-                "wrong_state",
-            ]
-        )
-
-        if fraud_type == "inflated_charge":
-            charge = random.uniform(max_charge * 2, max_charge * 5)
-        elif fraud_type == "round_amount":
-            charge = random.choice([100, 200, 500, 1000, 1500, 2000])
-        elif fraud_type == "duplicate_setup":
-            charge = random.uniform(min_charge, max_charge)
-        else:
-            charge = random.uniform(min_charge, max_charge)
-
-        # Wrong state fraud
-        if fraud_type == "wrong_state":
-            patient_state = random.choice([s for s in US_STATES if s != provider_state])
-        else:
-            patient_state = provider_state if random.random() > 0.1 else random.choice(US_STATES)
-    else:
-        charge = random.uniform(min_charge, max_charge)
-        patient_state = provider_state if random.random() > 0.1 else random.choice(US_STATES)
-
-    service_date = base_date - timedelta(days=random.randint(0, 365))
-    submitted_date = service_date + timedelta(days=random.randint(1, 30))
-
-    return {
-        "claim_id": claim_id,
-        "patient_id": patient_id,
-        "provider_id": provider_id,
-        "provider_name": f"Provider {provider_id[-4:]}",
-        "procedure_code": procedure,
-        "diagnosis_code": random.choice(DIAGNOSIS_CODES),
-        "service_date": service_date,
-        "submitted_date": submitted_date,
-        "charge_amount": Decimal(str(round(charge, 2))),
-        "paid_amount": Decimal(str(round(charge * random.uniform(0.6, 0.9), 2))),
-        "patient_state": patient_state,
-        "provider_state": provider_state,
-        "place_of_service": random.choice(PLACES_OF_SERVICE),
-    }
+    digest = F.sha2(F.concat_ws(":", F.lit(prefix), F.lit(salt), *keys), 256)
+    return F.concat(F.lit(prefix), F.upper(F.substring(digest, 1, length)))
 
 
 def generate_sample_claims(
@@ -263,12 +191,14 @@ def generate_sample_claims(
     fraud_rate: float = 0.05,
     num_providers: int = 100,
     num_patients: int = 1000,
+    fmt: str = "parquet",
 ) -> None:
     """
-    Generate a dataset of synthetic insurance claims and write to CSV.
+    Generate a dataset of synthetic insurance claims and write it to ``output_path``.
 
-    Creates a pool of providers and patients, then generates claims with a
-    controlled proportion of fraudulent records. Fraudulent claims may also
+    Draws claims from pools of providers and patients, with a controlled
+    proportion of fraudulent records. Every column is generated by Spark from
+    ``spark.range(num_claims)``, so nothing is collected on the driver. Fraudulent claims may also
     spawn exact duplicates (with different claim IDs) to simulate duplicate
     billing fraud (this happens with probability 0.2).
 
@@ -278,8 +208,8 @@ def generate_sample_claims(
     Parameters
     ----------
     output_path : str
-        Directory path where the CSV output will be written. PySpark writes
-        to a directory containing part files with a header row.
+        Directory path where the output will be written. PySpark writes
+        to a directory containing one part file per partition.
     num_claims : int, optional
         Target number of claims to generate, by default 10000. Actual count
         may be slightly higher due to duplicate fraud injection.
@@ -290,69 +220,102 @@ def generate_sample_claims(
         Number of unique healthcare providers in the dataset, by default 100.
     num_patients : int, optional
         Number of unique patients in the dataset, by default 1000.
+    fmt : str, optional
+        ``"parquet"`` or ``"csv"`` (with a header row), by default ``"parquet"``.
+        Parquet output also carries the integer state codes added by
+        :func:`~fraud_detection.schema.encode_states`.
 
     Notes
     -----
     This function starts a local Spark session internally and stops it upon
-    completion. The output is coalesced to a single partition for convenience.
+    completion. Partitions are written in parallel; Parquet output lets the
+    detection rules read only the columns they reference.
     """
-    spark = SparkSession.builder.master("local[*]").appName("SampleDataGen").getOrCreate()
+    spark = create_spark_session("SampleDataGen", local=True)
 
     try:
-        # Generate provider and patient pools
-        providers = [(generate_id("PRV"), random.choice(US_STATES)) for _ in range(num_providers)]
-        patients = [generate_id("PAT") for _ in range(num_patients)]
-
-        base_date = date.today()
-        claims: list[dict[str, str | date | Decimal]] = []
-
-        for _ in range(num_claims):
-            claim_id = generate_id("CLM")
-            patient_id = random.choice(patients)
-            provider_id, provider_state = random.choice(providers)
-            is_fraudulent = random.random() < fraud_rate
-
-            claim = generate_claim(
-                claim_id,
-                patient_id,
-                provider_id,
-                provider_state,
-                base_date,
-                is_fraudulent=is_fraudulent,
-            )
-            claims.append(claim)
-
-            # Add some exact duplicates for fraud
-            if is_fraudulent and random.random() < 0.2:
-                duplicate = claim.copy()
-                duplicate["claim_id"] = generate_id("CLM")
-                claims.append(duplicate)
-
-        # Create DataFrame
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("provider_name", StringType(), True),
-                StructField("procedure_code", StringType(), False),
-                StructField("diagnosis_code", StringType(), True),
-                StructField("service_date", DateType(), False),
-                StructField("submitted_date", DateType(), True),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("paid_amount", DecimalType(10, 2), True),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-                StructField("place_of_service", StringType(), True),
-            ]
+        seeds = count(random.randrange(1 << 31))
+        salt = next(seeds)
+        states = len(US_STATES)
+
+        draws = spark.range(num_claims).withColumns(
+            {
+                "_provider_ix": _random_index(num_providers, next(seeds)),
+                "_patient_ix": _random_index(num_patients, next(seeds)),
+                "_procedure_ix": _random_index(len(PROCEDURE_CODES), next(seeds)),
+                "_fraud_type": F.when(F.rand(next(seeds)) < fraud_rate, _random_index(4, next(seeds))),
+                "_charge_draw": F.rand(next(seeds)),
+                "_round_ix": _random_index(len(ROUND_CHARGES), next(seeds)),
+                "_moved": F.rand(next(seeds)) <= 0.1,
+                "_state_draw": _random_index(states, next(seeds)),
+                "_state_offset": _random_index(states - 1, next(seeds)) + 1,
+                "_service_offset": _random_index(366, next(seeds)),
+                "_submission_lag": _random_index(30, next(seeds)) + 1,
+                "_paid_ratio": F.rand(next(seeds)) * 0.3 + 0.6,
+                "_diagnosis_ix": _random_index(len(DIAGNOSIS_CODES), next(seeds)),
+                "_place_ix": _random_index(len(PLACES_OF_SERVICE), next(seeds)),
+                "_duplicated": F.rand(next(seeds)) < 0.2,
+            }
         )
 
-        df = spark.createDataFrame(claims, schema)  # type: ignore[type-var]
+        min_charge = _lookup([PROCEDURE_CHARGES[code][0] for code in PROCEDURE_CODES], F.col("_procedure_ix"))
+        max_charge = _lookup([PROCEDURE_CHARGES[code][1] for code in PROCEDURE_CODES], F.col("_procedure_ix"))
+        fraud_type = F.col("_fraud_type")
+
+        # Each provider keeps one state; its patients mostly live there, and
+        # wrong-state fraud always picks a different one
+        provider_state_ix = F.pmod(F.xxhash64(F.lit(salt), F.col("_provider_ix")), F.lit(states))
+        patient_state_ix = (
+            F.when(fraud_type == WRONG_STATE, F.pmod(provider_state_ix + F.col("_state_offset"), F.lit(states)))
+            .when(F.col("_moved"), F.col("_state_draw"))
+            .otherwise(provider_state_ix)
+        )
 
-        # Write to CSV
-        df.coalesce(1).write.mode("overwrite").option("header", "true").csv(output_path)
+        charge = (
+            F.when(fraud_type == INFLATED_CHARGE, max_charge * (2 + F.col("_charge_draw") * 3))
+            .when(fraud_type == ROUND_AMOUNT, _lookup(ROUND_CHARGES, F.col("_round_ix")))
+            .otherwise(min_charge + F.col("_charge_draw") * (max_charge - min_charge))
+        )
+        service_date = F.date_sub(F.lit(date.today()), F.col("_service_offset"))
+
+        # Fraudulent claims are sometimes billed twice: the copy repeats every
+        # field but the claim ID
+        copies = F.when(fraud_type.isNotNull() & F.col("_duplicated"), F.array(F.lit(0), F.lit(1))).otherwise(F.array(F.lit(0)))
+
+        claims = (
+            draws.withColumns(
+                {
+                    "provider_id": generate_id("PRV", salt, F.col("_provider_ix")),
+                    "patient_id": generate_id("PAT", salt, F.col("_patient_ix")),
+                    "procedure_code": _lookup(PROCEDURE_CODES, F.col("_procedure_ix")),
+                    "diagnosis_code": _lookup(DIAGNOSIS_CODES, F.col("_diagnosis_ix")),
+                    "service_date": service_date,
+                    "submitted_date": F.date_add(service_date, F.col("_submission_lag")),
+                    "charge_amount": charge,
+                    "patient_state": _lookup(US_STATES, patient_state_ix),
+                    "provider_state": _lookup(US_STATES, provider_state_ix),
+                    "place_of_service": _lookup(PLACES_OF_SERVICE, F.col("_place_ix")),
+                    "_copies": copies,
+                }
+            )
+            .withColumns(
+                {
+                    "provider_name": F.concat(F.lit("Provider "), F.substring("provider_id", -4, 4)),
+                    "paid_amount": F.col("charge_amount") * F.col("_paid_ratio"),
+                }
+            )
+            .withColumn("_copy", F.explode("_copies"))
+            .withColumn("claim_id", generate_id("CLM", salt, F.col("id"), F.col("_copy")))
+            .select(*[F.col(field.name).cast(field.dataType) for field in CLAIMS_SCHEMA.fields])
+        )
+
+        if fmt == "csv":
+            claims.write.mode("overwrite").option("header", "true").csv(output_path)
+        else:
+            # Same layout as claims staged from text by utils.io.prepare_claims
+            encode_states(claims).write.mode("overwrite").parquet(output_path)
 
-        logger.info("Generated %d claims", len(claims))
+        logger.info("Generated %d claims plus duplicates as %s", num_claims, fmt)
         logger.info("Approximate fraud rate: %.1f%%", fraud_rate * 100)
 
     finally:
@@ -360,4 +323,5 @@ def generate_sample_claims(
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     generate_sample_claims("./sample_claims", num_claims=10000)
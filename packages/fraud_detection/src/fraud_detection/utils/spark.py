@@ -0,0 +1,93 @@
+"""Shared Spark session construction for the CLI, jobs and utilities."""
+
+from pyspark.sql import DataFrame, SparkSession
+
+# Adaptive execution coalesces small shuffle partitions, splits skewed join partitions
+# (joins back from per-provider and per-patient aggregates, where a few prolific keys
+# dominate) and converts sort-merge joins to broadcast joins at runtime when one side
+# turns out small. Near-duplicate pairing is a grouped aggregation, which AQE does not
+# split; its groups are bounded by date bucket instead.
+SPARK_CONFIG: dict[str, str] = {
+    "spark.sql.adaptive.enabled": "true",
+    "spark.sql.adaptive.coalescePartitions.enabled": "true",
+    "spark.sql.adaptive.skewJoin.enabled": "true",
+    "spark.sql.adaptive.localShuffleReader.enabled": "true",
+    "spark.sql.adaptive.advisoryPartitionSizeInBytes": "64m",
+    "spark.sql.optimizer.dynamicPartitionPruning.enabled": "true",
+    "spark.sql.autoBroadcastJoinThreshold": "64m",
+    "spark.serializer": "org.apache.spark.serializer.KryoSerializer",
+    "spark.shuffle.file.buffer": "1m",
+    "spark.reducer.maxSizeInFlight": "96m",
+    # zstd (parquet-mr default level 3) decodes about as fast as snappy with noticeably smaller files
+    "spark.sql.parquet.compression.codec": "zstd",
+    # Rows per Arrow batch handed to pandas UDFs / toPandas: 8192 rows of four 8-byte columns is
+    # 256 KiB, about one core's L2, so a batch's columns stay cache-resident while a UDF works on
+    # them. Grouped functions (applyInPandas) receive each group whole regardless of this cap.
+    "spark.sql.execution.arrow.maxRecordsPerBatch": "8192",
+}
+
+# Cluster-only settings: release idle executors between phases (e.g. detection then analysis)
+# without an external shuffle service; shuffle tracking keeps executors holding live shuffle data.
+CLUSTER_CONFIG: dict[str, str] = {
+    "spark.dynamicAllocation.enabled": "true",
+    "spark.dynamicAllocation.shuffleTracking.enabled": "true",
+    "spark.dynamicAllocation.executorIdleTimeout": "60s",
+}
+
+
+def create_spark_session(app_name: str, /, *, local: bool = False) -> SparkSession:
+    """
+    Create (or reuse) a Spark session with the project's execution settings.
+
+    Parameters
+    ----------
+    app_name : str
+        Application name shown in the Spark UI and cluster manager.
+    local : bool, optional
+        If True, run with a local master using all available cores,
+        by default False (master is taken from spark-submit).
+
+    Returns
+    -------
+    SparkSession
+        Configured Spark session.
+    """
+    builder = SparkSession.builder.appName(app_name)
+
+    if local:
+        builder = builder.master("local[*]")
+
+    for key, value in SPARK_CONFIG.items():
+        builder = builder.config(key, value)
+
+    if not local:
+        for key, value in CLUSTER_CONFIG.items():
+            builder = builder.config(key, value)
+
+    return builder.getOrCreate()
+
+
+def checkpoint_and_release(result: DataFrame, cached: DataFrame, /) -> DataFrame:
+    """
+    Materialize ``result`` with an eager local checkpoint, then unpersist ``cached``.
+
+    The order matters: unpersisting before ``result`` is materialized would
+    simply recompute ``cached`` on the next action. ``cached`` is released even
+    if the checkpoint fails.
+
+    Parameters
+    ----------
+    result : DataFrame
+        Lazy result computed from ``cached``.
+    cached : DataFrame
+        Persisted input owned by the caller of this function.
+
+    Returns
+    -------
+    DataFrame
+        ``result`` backed by checkpointed partitions instead of its lineage.
+    """
+    try:
+        return result.localCheckpoint(eager=True)
+    finally:
+        cached.unpersist()
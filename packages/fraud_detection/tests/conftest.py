@@ -2,11 +2,13 @@
 
 from datetime import date
 from decimal import Decimal
-from typing import Generator
+from typing import Any, Callable, Generator
 
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
 import pytest
 from pyspark.sql import DataFrame, SparkSession
-from pyspark.sql.types import DateType, DecimalType, StringType, StructField, StructType
+from pyspark.sql.types import DateType, DecimalType, DoubleType, StringType, StructField, StructType
 
 
 @pytest.fixture(scope="session")
@@ -15,8 +17,17 @@ def spark() -> Generator[SparkSession, None, None]:
     session = (
         SparkSession.builder.master("local[2]")
         .appName("FraudDetectionTests")
-        .config("spark.sql.shuffle.partitions", "2")
+        # One reducer per shuffle for these few-row inputs; inputs still split across two map
+        # tasks, so partial aggregates are merged across partitions as in production
+        .config("spark.sql.shuffle.partitions", "1")
         .config("spark.default.parallelism", "2")
+        # Same adaptive execution and broadcast settings as utils.spark.SPARK_CONFIG, so tests plan like production
+        .config("spark.sql.adaptive.enabled", "true")
+        .config("spark.sql.adaptive.coalescePartitions.enabled", "true")
+        .config("spark.sql.adaptive.skewJoin.enabled", "true")
+        .config("spark.sql.autoBroadcastJoinThreshold", "64m")
+        # Hands pandas-built fixtures to the JVM as Arrow batches rather than pickled rows
+        .config("spark.sql.execution.arrow.pyspark.enabled", "true")
         .config("spark.ui.enabled", "false")
         .getOrCreate()
     )
@@ -24,7 +35,13 @@ def spark() -> Generator[SparkSession, None, None]:
     session.stop()
 
 
-@pytest.fixture
+def _cached(claims: DataFrame) -> DataFrame:
+    """Cache and materialize a session-wide fixture DataFrame so tests share one copy."""
+    claims.cache().count()
+    return claims
+
+
+@pytest.fixture(scope="session")
 def claims_schema() -> StructType:
     """Create standard claims schema for testing."""
     return StructType(
@@ -41,7 +58,40 @@ def claims_schema() -> StructType:
     )
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
+def claims_schema_with_coords(request: pytest.FixtureRequest) -> StructType:
+    """Create the standard claims schema extended with patient and provider coordinates."""
+    schema: StructType = request.getfixturevalue("claims_schema")
+    return StructType(
+        [
+            *schema.fields,
+            StructField("patient_lat", DoubleType(), True),
+            StructField("patient_lon", DoubleType(), True),
+            StructField("provider_lat", DoubleType(), True),
+            StructField("provider_lon", DoubleType(), True),
+        ]
+    )
+
+
+@pytest.fixture(scope="session")
+def make_claims(request: pytest.FixtureRequest) -> Callable[[list[tuple[Any, ...]] | pd.DataFrame], DataFrame]:
+    """
+    Return a factory that builds a claims DataFrame with the standard schema.
+
+    Rows may be given as tuples or as a pandas DataFrame with the schema's columns;
+    either way they are sent to Spark as a columnar Arrow batch.
+    """
+    spark_session: SparkSession = request.getfixturevalue("spark")
+    schema: StructType = request.getfixturevalue("claims_schema")
+
+    def make(rows: list[tuple[Any, ...]] | pd.DataFrame) -> DataFrame:
+        claims = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows, columns=schema.names)
+        return spark_session.createDataFrame(claims, schema)
+
+    return make
+
+
+@pytest.fixture(scope="session")
 def sample_claims(request: pytest.FixtureRequest) -> DataFrame:
     """Create sample claims data for testing."""
     spark_session: SparkSession = request.getfixturevalue("spark")
@@ -56,26 +106,35 @@ def sample_claims(request: pytest.FixtureRequest) -> DataFrame:
         ("CLM006", "PAT005", "PRV003", "97110", date(2024, 1, 20), d("75.00"), "FL", "FL"),
         ("CLM007", "PAT006", "PRV003", "97110", date(2024, 1, 21), d("1000.00"), "FL", "FL"),
     ]
-    return spark_session.createDataFrame(data, schema)  # type: ignore[arg-type]
+    return _cached(spark_session.createDataFrame(data, schema))  # type: ignore[arg-type]
+
 
+def _numbered(prefix: str, count: int) -> np.ndarray:
+    """Return ``prefix`` followed by a zero-padded three-digit index, for ``count`` rows."""
+    return np.char.add(prefix, np.char.zfill(np.arange(count).astype(str), 3))
 
-@pytest.fixture
+
+@pytest.fixture(scope="session")
 def high_volume_provider_claims(request: pytest.FixtureRequest) -> DataFrame:
     """Create claims data with a provider exceeding daily limits."""
-    spark_session: SparkSession = request.getfixturevalue("spark")
-    schema: StructType = request.getfixturevalue("claims_schema")
-    d = Decimal
-    data: list[tuple[str, str, str, str, date, Decimal, str, str]] = []
-    # Provider with 60 procedures on same day (exceeds limit of 50)
-    for i in range(60):
-        data.append((f"CLM{i:03d}", f"PAT{i:03d}", "PRV_HIGH", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"))
-    # Normal provider
-    for i in range(10):
-        data.append((f"CLMN{i:03d}", f"PATN{i:03d}", "PRV_NORMAL", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"))
-    return spark_session.createDataFrame(data, schema)  # type: ignore[arg-type]
+    make: Callable[[pd.DataFrame], DataFrame] = request.getfixturevalue("make_claims")
+    # Provider with 60 procedures on same day (exceeds limit of 50), then a normal provider with 10
+    claims = pd.DataFrame(
+        {
+            "claim_id": np.concatenate([_numbered("CLM", 60), _numbered("CLMN", 10)]),
+            "patient_id": np.concatenate([_numbered("PAT", 60), _numbered("PATN", 10)]),
+            "provider_id": np.repeat(["PRV_HIGH", "PRV_NORMAL"], [60, 10]),
+            "procedure_code": "99213",
+            "service_date": date(2024, 1, 15),
+            "charge_amount": Decimal("100.00"),
+            "patient_state": "CA",
+            "provider_state": "CA",
+        }
+    )
+    return _cached(make(claims))
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def weekend_claims(request: pytest.FixtureRequest) -> DataFrame:
     """Create claims with weekend billing patterns."""
     spark_session: SparkSession = request.getfixturevalue("spark")
@@ -91,4 +150,4 @@ def weekend_claims(request: pytest.FixtureRequest) -> DataFrame:
         ("CLM005", "PAT005", "PRV_NORMAL", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
         ("CLM006", "PAT006", "PRV_NORMAL", "99213", date(2024, 1, 16), d("100.00"), "CA", "CA"),
     ]
-    return spark_session.createDataFrame(data, schema)  # type: ignore[arg-type]
+    return _cached(spark_session.createDataFrame(data, schema))  # type: ignore[arg-type]
@@ -1,14 +1,29 @@
 """Tests for billing pattern rules."""
 
-from datetime import date
+from collections.abc import Callable
+from datetime import date, timedelta
 from decimal import Decimal
 
+import pandas as pd  # type: ignore[import-untyped]
 import pytest
-from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql import Column, DataFrame, SparkSession
+from pyspark.sql import functions as F
 from pyspark.sql.types import StringType, StructField, StructType
 
 from fraud_detection.detector import DetectionConfig
-from fraud_detection.rules.billing_patterns import BillingPatternRules
+from fraud_detection.rules.billing_patterns import BillingPatternRules, _find_unbundled_visit  # pyright: ignore[reportPrivateUsage]
+
+
+def _count_flags(df: DataFrame, **conditions: Column) -> dict[str, int]:
+    """
+    Count the rows matching each condition, all in one aggregation.
+
+    The aggregate references only the condition columns, so the optimizer prunes
+    every other result column before the scan; no explicit select is needed.
+    """
+    row = df.agg(*[F.count_if(condition).alias(name) for name, condition in conditions.items()]).first()
+    assert row
+    return row.asDict()
 
 
 class TestBillingPatternRules:
@@ -31,22 +46,19 @@ class TestBillingPatternRules:
         """Test that providers exceeding daily limits are flagged."""
         result = rules.check_daily_procedure_limits(high_volume_provider_claims)
 
-        # Get flagged claims for high volume provider
-        high_vol_flagged = result.filter((result.provider_id == "PRV_HIGH") & (result.daily_procedure_limit_exceeded)).count()
-
-        # All 60 claims from high volume provider should be flagged
-        assert high_vol_flagged == 60
-
-        # Normal provider should not be flagged
-        normal_flagged = result.filter((result.provider_id == "PRV_NORMAL") & (result.daily_procedure_limit_exceeded)).count()
+        flagged = _count_flags(
+            result,
+            high_volume=(result.provider_id == "PRV_HIGH") & result.daily_procedure_limit_exceeded,
+            normal=(result.provider_id == "PRV_NORMAL") & result.daily_procedure_limit_exceeded,
+        )
 
-        assert normal_flagged == 0
+        # All 60 claims from high volume provider should be flagged, and none from the normal provider
+        assert flagged == {"high_volume": 60, "normal": 0}
 
     def test_patient_claim_frequency_detects_multiple_daily_claims(
         self,
         rules: BillingPatternRules,
-        spark: SparkSession,
-        claims_schema: StructType,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test detection of patients with excessive daily claims."""
 
@@ -63,19 +75,18 @@ class TestBillingPatternRules:
             ("CLM007", "PAT_NORMAL", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM008", "PAT_NORMAL", "PRV002", "99214", date(2024, 1, 15), d("150.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         result = rules.check_patient_claim_frequency(claims)
 
-        # High frequency patient should be flagged
-        high_freq_flagged = result.filter((result.patient_id == "PAT_HIGH") & (result.patient_frequency_exceeded)).count()
-
-        assert high_freq_flagged == 6
-
-        # Normal patient should not be flagged
-        normal_flagged = result.filter((result.patient_id == "PAT_NORMAL") & (result.patient_frequency_exceeded)).count()
+        flagged = _count_flags(
+            result,
+            high_frequency=(result.patient_id == "PAT_HIGH") & result.patient_frequency_exceeded,
+            normal=(result.patient_id == "PAT_NORMAL") & result.patient_frequency_exceeded,
+        )
 
-        assert normal_flagged == 0
+        # High frequency patient should be flagged, the normal patient should not
+        assert flagged == {"high_frequency": 6, "normal": 0}
 
     def test_weekend_billing_flags_high_weekend_ratio(
         self,
@@ -85,22 +96,58 @@ class TestBillingPatternRules:
         """Test that providers with high weekend billing are flagged."""
         result = rules.check_weekend_billing(weekend_claims)
 
-        # Weekend provider should have weekend billing flagged
-        weekend_flagged = result.filter((result.provider_id == "PRV_WEEKEND") & (result.weekend_billing_flag)).count()
+        flagged = _count_flags(
+            result,
+            weekend=(result.provider_id == "PRV_WEEKEND") & result.weekend_billing_flag,
+            normal=(result.provider_id == "PRV_NORMAL") & result.weekend_billing_flag,
+        )
+
+        # All 4 weekend claims should be flagged; the normal provider (weekdays only) should have none
+        assert flagged == {"weekend": 4, "normal": 0}
 
-        # All 4 weekend claims should be flagged
-        assert weekend_flagged == 4
+    def test_apply_all_matches_individual_checks(
+        self,
+        rules: BillingPatternRules,
+        high_volume_provider_claims: DataFrame,
+        weekend_claims: DataFrame,
+    ) -> None:
+        """Test that the fused pass produces the same flags as the individual checks."""
+        flag_columns = [
+            "daily_procedure_limit_exceeded",
+            "patient_frequency_exceeded",
+            "weekend_billing_flag",
+            "round_amount_flag",
+        ]
+        claims = high_volume_provider_claims.unionByName(weekend_claims)
 
-        # Normal provider (weekdays only) should not have any flagged
-        normal_flagged = result.filter((result.provider_id == "PRV_NORMAL") & (result.weekend_billing_flag)).count()
+        individual = rules.check_round_amounts(
+            rules.check_weekend_billing(rules.check_patient_claim_frequency(rules.check_daily_procedure_limits(claims)))
+        )
+        # Read by two actions below; checkpoint so the rule pipeline runs once
+        fused = rules.apply_all(claims).localCheckpoint(eager=True)
+
+        assert set(individual.columns) == set(fused.columns)
+        assert sorted(individual.select("claim_id", *flag_columns).collect()) == sorted(fused.select("claim_id", *flag_columns).collect())
+        assert _count_flags(fused, daily=fused.daily_procedure_limit_exceeded, weekend=fused.weekend_billing_flag) == {"daily": 60, "weekend": 4}
 
-        assert normal_flagged == 0
+    def test_weekend_billing_reuses_precomputed_indicators(
+        self,
+        rules: BillingPatternRules,
+        weekend_claims: DataFrame,
+    ) -> None:
+        """Test that indicators computed up front are reused rather than re-derived."""
+        precomputed = weekend_claims.withColumns({**rules.weekend_columns(), **rules.round_amount_columns()})
+
+        result = rules.check_weekend_billing(precomputed)
+
+        assert result.columns.count("is_weekend") == 1
+        assert "is_round_fifty" in result.columns
+        assert _count_flags(result, weekend=(result.provider_id == "PRV_WEEKEND") & result.weekend_billing_flag) == {"weekend": 4}
 
     def test_round_amounts_detected(
         self,
         rules: BillingPatternRules,
-        spark: SparkSession,
-        claims_schema: StructType,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test detection of round amount patterns."""
         d = Decimal
@@ -116,25 +163,66 @@ class TestBillingPatternRules:
             ("CLM007", "PAT007", "PRV_NORMAL", "99215", date(2024, 1, 17), d("241.99"), "CA", "CA"),
             ("CLM008", "PAT008", "PRV_NORMAL", "99213", date(2024, 1, 18), d("89.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         result = rules.check_round_amounts(claims)
 
-        # Round amount provider should have flagged claims
-        round_flagged = result.filter((result.provider_id == "PRV_ROUND") & (result.round_amount_flag)).count()
+        flagged = _count_flags(
+            result,
+            round_amount=(result.provider_id == "PRV_ROUND") & result.round_amount_flag,
+            normal=(result.provider_id == "PRV_NORMAL") & result.round_amount_flag,
+        )
+
+        # Round amount provider should have flagged claims, the normal provider none
+        assert flagged == {"round_amount": 4, "normal": 0}
+
+        ratios = {row.provider_id: row.provider_round_ratio for row in result.select("provider_id", "provider_round_ratio").distinct().collect()}
+        assert ratios == {"PRV_ROUND": 1.0, "PRV_NORMAL": 0.0}
 
-        assert round_flagged == 4
+    def test_weekend_indicators_match_calendar(
+        self,
+        rules: BillingPatternRules,
+        make_claims: Callable[..., DataFrame],
+    ) -> None:
+        """Test the epoch-day weekend arithmetic against dayofweek, including pre-1970 dates."""
+        d = Decimal
+        dates = [date(2024, 1, 13) + timedelta(days=i) for i in range(7)] + [date(1969, 12, 27), date(1969, 12, 29)]
+        data = [(f"CLM{i:03d}", "PAT001", "PRV001", "99213", day, d("100.00"), "CA", "CA") for i, day in enumerate(dates)]
+        claims = make_claims(data)
 
-        # Normal provider should not have round amount flags
-        normal_flagged = result.filter((result.provider_id == "PRV_NORMAL") & (result.round_amount_flag)).count()
+        result = claims.withColumns(rules.weekend_columns()).withColumn("expected", F.dayofweek("service_date"))
 
-        assert normal_flagged == 0
+        for row in result.collect():
+            assert row.day_of_week == row.expected
+            assert row.is_weekend == (row.expected in (1, 7))
+
+    def test_round_amount_indicators(
+        self,
+        rules: BillingPatternRules,
+        make_claims: Callable[..., DataFrame],
+    ) -> None:
+        """Test the round hundred/fifty indicators, including cents and non-positive amounts."""
+        d = Decimal
+        amounts = ["300.00", "250.00", "150.50", "0.00", "-100.00"]
+        data = [(f"CLM{i:03d}", "PAT001", "PRV001", "99213", date(2024, 1, 15), d(a), "CA", "CA") for i, a in enumerate(amounts)]
+        claims = make_claims(data)
+
+        result = claims.withColumns(rules.round_amount_columns())
+
+        flags = {str(row.charge_amount): (row.is_round_hundred, row.is_round_fifty) for row in result.collect()}
+        assert flags == {
+            "300.00": (True, True),
+            "250.00": (False, True),
+            "150.50": (False, False),
+            "0.00": (False, False),
+            "-100.00": (False, False),
+        }
 
     def test_procedure_unbundling_detected(
         self,
         rules: BillingPatternRules,
         spark: SparkSession,
-        claims_schema: StructType,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test detection of procedure unbundling."""
         d = Decimal
@@ -161,7 +249,7 @@ class TestBillingPatternRules:
             ("CLM003", "PAT_NORMAL", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM004", "PAT_NORMAL", "PRV001", "36415", date(2024, 1, 15), d("25.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         result = rules.check_procedure_unbundling(claims, bundled_procedures)
 
@@ -169,19 +257,21 @@ class TestBillingPatternRules:
         assert "procedures_same_day" in result.columns
         assert "unbundling_flag" in result.columns
 
-        # Unbundled claims should be flagged
-        unbundle_flagged = result.filter((result.patient_id == "PAT_UNBUNDLE") & (result.unbundling_flag)).count()
-        assert unbundle_flagged > 0
+        flagged = _count_flags(
+            result,
+            unbundled=(result.patient_id == "PAT_UNBUNDLE") & result.unbundling_flag,
+            normal=(result.patient_id == "PAT_NORMAL") & result.unbundling_flag,
+        )
 
-        # Normal patient should not be flagged
-        normal_flagged = result.filter((result.patient_id == "PAT_NORMAL") & (result.unbundling_flag)).count()
-        assert normal_flagged == 0
+        # Unbundled claims should be flagged, the normal patient should not
+        assert flagged["unbundled"] > 0
+        assert flagged["normal"] == 0
 
     def test_procedure_unbundling_no_match(
         self,
         rules: BillingPatternRules,
         spark: SparkSession,
-        claims_schema: StructType,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test unbundling check with no matching unbundled pairs."""
 
@@ -203,10 +293,46 @@ class TestBillingPatternRules:
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM002", "PAT001", "PRV001", "99214", date(2024, 1, 15), d("150.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         result = rules.check_procedure_unbundling(claims, bundled_procedures)
 
         # No claims should be flagged
-        flagged = result.filter(result.unbundling_flag).count()
-        assert flagged == 0
+        assert result.filter(result.unbundling_flag).limit(1).collect() == []
+
+
+class TestFindUnbundledVisit:
+    """Tests for the per-visit bundle matching."""
+
+    def test_smallest_matching_bundle_returned(self) -> None:
+        """Test that a visit billing both components of several bundles reports the smallest bundle code."""
+        bundles = {"80048": [("80076", "80053")], "85027": [("85004", "85025")], "99213": [("99999", "11111")]}
+        visit = pd.DataFrame(
+            {
+                "patient_id": ["PAT001"] * 5,
+                "service_date": [date(2024, 1, 15)] * 5,
+                "provider_id": ["PRV001"] * 5,
+                "procedure_code": ["85004", "80076", "85027", "80048", None],
+            }
+        )
+
+        result = _find_unbundled_visit(visit, bundles=bundles)
+
+        assert len(result) == 1
+        assert result.procedures_same_day.iloc[0] == ["80048", "80076", "85004", "85027"]
+        assert result.bundled_code.iloc[0] == "80053"
+
+    def test_no_match_returns_none(self) -> None:
+        """Test that a visit with only one component of a bundle has no bundled code."""
+        visit = pd.DataFrame(
+            {
+                "patient_id": ["PAT001"],
+                "service_date": [date(2024, 1, 15)],
+                "provider_id": ["PRV001"],
+                "procedure_code": ["80048"],
+            }
+        )
+
+        result = _find_unbundled_visit(visit, bundles={"80048": [("80076", "80053")]})
+
+        assert result.bundled_code.iloc[0] is None
@@ -1,14 +1,14 @@
 """Tests for the main fraud detector orchestrator."""
 
+from collections.abc import Callable
 from datetime import date
 from decimal import Decimal
 
 import pytest
-from pyspark.sql import SparkSession
+from pyspark.sql import DataFrame, SparkSession
 from pyspark.sql.types import (
-    DateType,
+    BooleanType,
     DecimalType,
-    DoubleType,
     StringType,
     StructField,
     StructType,
@@ -28,12 +28,14 @@ class TestDetectionConfig:
         assert config.outlier_iqr_multiplier == 1.5
         assert config.duplicate_similarity_threshold == 0.9
         assert config.duplicate_time_window_days == 30
+        assert config.duplicate_group_keys == ("patient_id", "provider_id")
         assert config.max_provider_patient_distance_miles == 500.0
         assert config.max_daily_procedures_per_provider == 50
         assert config.max_claims_per_patient_per_day == 5
         assert config.weight_rule_violation == 0.3
         assert config.weight_statistical_anomaly == 0.25
         assert config.weight_duplicate == 0.45
+        assert config.materialize_duplicates is True
 
     def test_custom_values(self) -> None:
         """Test that custom configuration values are applied."""
@@ -69,26 +71,6 @@ class TestFraudDetector:
         """Create FraudDetector with default config."""
         return FraudDetector(spark)
 
-    @pytest.fixture
-    def claims_schema_with_coords(self) -> StructType:
-        """Schema with coordinate columns for geographic tests."""
-        return StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-                StructField("patient_lat", DoubleType(), True),
-                StructField("patient_lon", DoubleType(), True),
-                StructField("provider_lat", DoubleType(), True),
-                StructField("provider_lon", DoubleType(), True),
-            ]
-        )
-
     def test_detector_initialization(self, detector: FraudDetector, config: DetectionConfig) -> None:
         """Test that detector initializes all components correctly."""
         assert detector.config == config
@@ -235,41 +217,11 @@ class TestFraudDetector:
     def test_detect_with_rule_violations(
         self,
         detector: FraudDetector,
-        spark: SparkSession,
+        high_volume_provider_claims: DataFrame,
     ) -> None:
         """Test detection catches rule violations."""
-        # Create schema without coords
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
-        d = Decimal
         # Provider with 60 procedures on same day (exceeds limit of 50)
-        data: list[tuple[str, str, str, str, date, Decimal, str, str]] = []
-        for i in range(60):
-            data.append(
-                (
-                    f"CLM{i:03d}",
-                    f"PAT{i:03d}",
-                    "PRV_HIGH",
-                    "99213",
-                    date(2024, 1, 15),
-                    d("100.00"),
-                    "CA",
-                    "CA",
-                )
-            )
-
-        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+        claims = high_volume_provider_claims.filter(high_volume_provider_claims.provider_id == "PRV_HIGH")
 
         result = detector.detect(claims)
 
@@ -284,28 +236,15 @@ class TestFraudDetector:
     def test_apply_rules(
         self,
         detector: FraudDetector,
-        spark: SparkSession,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test _apply_rules method directly."""
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
         d = Decimal
         data = [
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "NY"),
         ]
-        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         # pylint: disable=protected-access
         result = detector._apply_rules(claims)  # pyright: ignore[reportPrivateUsage]
@@ -320,22 +259,9 @@ class TestFraudDetector:
     def test_apply_statistics(
         self,
         detector: FraudDetector,
-        spark: SparkSession,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test _apply_statistics method directly."""
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
         d = Decimal
         data = [
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
@@ -343,7 +269,7 @@ class TestFraudDetector:
             ("CLM003", "PAT003", "PRV001", "99213", date(2024, 1, 17), d("105.00"), "CA", "CA"),
             ("CLM004", "PAT004", "PRV001", "99213", date(2024, 1, 18), d("5000.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         # pylint: disable=protected-access
         result = detector._apply_statistics(claims)  # pyright: ignore[reportPrivateUsage]
@@ -356,22 +282,9 @@ class TestFraudDetector:
     def test_detect_duplicates(
         self,
         detector: FraudDetector,
-        spark: SparkSession,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test _detect_duplicates method directly."""
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
         d = Decimal
         data = [
             # Exact duplicates
@@ -380,7 +293,7 @@ class TestFraudDetector:
             # Different claim
             ("CLM003", "PAT002", "PRV001", "99214", date(2024, 1, 16), d("150.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         # pylint: disable=protected-access
         result = detector._detect_duplicates(claims)  # pyright: ignore[reportPrivateUsage]
@@ -392,27 +305,14 @@ class TestFraudDetector:
     def test_calculate_fraud_score(
         self,
         detector: FraudDetector,
-        spark: SparkSession,
+        make_claims: Callable[..., DataFrame],
     ) -> None:
         """Test _calculate_fraud_score method."""
-        schema = StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
         d = Decimal
         data = [
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
         ]
-        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+        claims = make_claims(data)
 
         # Run through full pipeline to get all columns
         result = detector.detect(claims)
@@ -434,3 +334,45 @@ class TestFraudDetector:
         ]
         for col in expected_cols:
             assert col in output_cols, f"Missing column: {col}"
+
+    def test_calculate_fraud_score_weighting(
+        self,
+        detector: FraudDetector,
+        spark: SparkSession,
+    ) -> None:
+        """Test that the score weights each flag by its category weight over the category size."""
+        schema = StructType(
+            [
+                StructField("claim_id", StringType(), False),
+                StructField("patient_id", StringType(), False),
+                StructField("provider_id", StringType(), False),
+                StructField("charge_amount", DecimalType(10, 2), False),
+                StructField("weekend_billing_flag", BooleanType(), True),
+                StructField("state_mismatch", BooleanType(), True),
+                StructField("round_amount_flag", BooleanType(), True),
+                StructField("charge_zscore_outlier", BooleanType(), True),
+                StructField("is_duplicate", BooleanType(), False),
+                StructField("duplicate_of", StringType(), True),
+            ]
+        )
+
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", d("100.00"), True, True, None, True, True, "CLM000"),
+            ("CLM002", "PAT002", "PRV001", d("100.00"), False, False, False, False, False, None),
+        ]
+        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+
+        # pylint: disable=protected-access
+        result = detector._calculate_fraud_score(claims)  # pyright: ignore[reportPrivateUsage]
+        rows = {row["claim_id"]: row for row in result.collect()}
+
+        flagged = rows["CLM001"]
+        assert flagged["fraud_score"] == pytest.approx(2 * 0.3 / 6 + 1 * 0.25 / 3 + 0.45)
+        assert sorted(flagged["fraud_reasons"]) == ["charge_zscore_outlier", "state_mismatch", "weekend_billing_flag"]
+        assert sorted(flagged["rule_violations"]) == ["state_mismatch", "weekend_billing_flag"]
+        assert flagged["statistical_flags"] == ["charge_zscore_outlier"]
+
+        clean = rows["CLM002"]
+        assert clean["fraud_score"] == pytest.approx(0.0)
+        assert clean["fraud_reasons"] == []
@@ -3,12 +3,19 @@
 from datetime import date
 from decimal import Decimal
 
+import pandas as pd  # type: ignore[import-untyped]
 import pytest
-from pyspark.sql import SparkSession
+from pyspark.sql import DataFrame, SparkSession
 from pyspark.sql.types import StructType
 
 from fraud_detection.detector import DetectionConfig
-from fraud_detection.rules.duplicates import DuplicateDetector
+from fraud_detection.rules.duplicates import DuplicateDetector, _pairs_within_window  # pyright: ignore[reportPrivateUsage]
+
+
+def _is_persisted(df: DataFrame) -> bool:
+    """Return whether Spark's cache manager holds data for ``df``'s plan, whichever frame persisted it."""
+    level = df.storageLevel
+    return level.useMemory or level.useDisk
 
 
 class TestDuplicateDetector:
@@ -23,6 +30,69 @@ class TestDuplicateDetector:
         )
         return DuplicateDetector(spark, config)
 
+    def test_detect_releases_its_own_cache(
+        self,
+        detector: DuplicateDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that detect persists its own projection of the input and releases it after materializing."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        # The same projection resolves to the cache entry detect() owned, if one is left
+        owned = claims.select(*claims.columns)
+        assert not _is_persisted(owned)
+        assert not claims.is_cached
+        assert not _is_persisted(claims)
+        assert result.filter(result.is_duplicate).count() == 1
+
+    def test_detect_keeps_caller_cache(
+        self,
+        detector: DuplicateDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that an input the caller cached is read through and stays cached."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema).cache()  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        assert _is_persisted(claims)
+        assert result.filter(result.is_duplicate).count() == 1
+        claims.unpersist()
+
+    def test_detect_leaves_caching_to_caller_when_configured(
+        self,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that turning materialize_duplicates off persists nothing and returns a lazy result."""
+        detector = DuplicateDetector(spark, DetectionConfig(materialize_duplicates=False))
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        assert not _is_persisted(claims)
+        assert not _is_persisted(claims.select(*claims.columns))
+        assert result.filter(result.is_duplicate).count() == 1
+
     def test_exact_duplicates_detected(
         self,
         detector: DuplicateDetector,
@@ -74,6 +144,83 @@ class TestDuplicateDetector:
         # Near duplicate should be detected
         assert len(near_dupes) == 1
 
+    def test_near_duplicates_with_provider_first_grouping(
+        self,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that the order of the grouping keys does not change the matches."""
+        detector = DuplicateDetector(spark, DetectionConfig(duplicate_group_keys=("provider_id", "patient_id")))
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 16), d("105.00"), "CA", "CA"),
+            ("CLM003", "PAT001", "PRV002", "99213", date(2024, 1, 16), d("100.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        near_dupes = {row.claim_id: row.near_duplicate_of for row in result.filter(result.is_near_duplicate).collect()}
+        assert near_dupes == {"CLM002": "CLM001"}
+
+    @pytest.mark.parametrize(
+        "group_keys",
+        [("patient_id", "patient_id"), ("provider_id", "claim_id"), ("patient_id",), ("patient_id", "provider_id", "procedure_code")],
+    )
+    def test_rejects_invalid_group_keys(self, spark: SparkSession, group_keys: tuple[str, ...]) -> None:
+        """Test that grouping keys other than an ordering of patient_id and provider_id are rejected."""
+        config = DetectionConfig(duplicate_group_keys=group_keys)  # type: ignore[arg-type]
+
+        with pytest.raises(ValueError, match="duplicate_group_keys"):
+            DuplicateDetector(spark, config)
+
+    def test_near_duplicates_across_date_buckets(
+        self,
+        detector: DuplicateDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that claims on either side of a date bucket boundary are still compared."""
+        d = Decimal
+        data = [
+            # Days 19739 and 19741 fall in different 30-day buckets (657 and 658)
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 17), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 19), d("102.00"), "CA", "CA"),
+            # Outside the 30-day window of both
+            ("CLM003", "PAT001", "PRV001", "99213", date(2024, 3, 1), d("100.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        near_dupes = {row.claim_id: row.near_duplicate_of for row in result.filter(result.is_near_duplicate).collect()}
+        assert near_dupes == {"CLM002": "CLM001"}
+
+    def test_near_duplicate_matches_original_not_exact_copy(
+        self,
+        detector: DuplicateDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that exact duplicates are left out of near-duplicate matching."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM003", "PAT001", "PRV001", "99213", date(2024, 1, 17), d("101.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect(claims)
+
+        rows = {row.claim_id: (row.is_exact_duplicate, row.is_near_duplicate, row.duplicate_of) for row in result.collect()}
+        assert rows == {
+            "CLM001": (False, False, None),
+            "CLM002": (True, False, "CLM001"),
+            "CLM003": (False, True, "CLM001"),
+        }
+
     def test_no_duplicates_in_unique_claims(
         self,
         detector: DuplicateDetector,
@@ -94,6 +241,8 @@ class TestDuplicateDetector:
         duplicates = result.filter(result.is_duplicate).count()
 
         assert duplicates == 0
+        # Keys that never repeat are not null-flagged after the left join
+        assert {(row.is_exact_duplicate, row.exact_duplicate_of) for row in result.collect()} == {(False, None)}
 
     def test_multiple_duplicate_groups(
         self,
@@ -123,6 +272,10 @@ class TestDuplicateDetector:
 
         assert duplicates == 3
 
+        # Every duplicate points at the smallest claim_id of its group, not a chain
+        exact = {row.claim_id: row.exact_duplicate_of for row in result.filter(result.is_exact_duplicate).collect()}
+        assert exact == {"CLM002": "CLM001", "CLM003": "CLM001", "CLM005": "CLM004"}
+
     def test_outside_time_window_not_duplicate(
         self,
         detector: DuplicateDetector,
@@ -144,3 +297,72 @@ class TestDuplicateDetector:
 
         # Should not be flagged as duplicates (outside time window)
         assert duplicates == 0
+
+
+class TestPairsWithinWindow:
+    """Tests for the per-group near-duplicate pairing."""
+
+    def test_pairs_limited_to_time_window(self) -> None:
+        """Test that only claims within the window are compared, greater claim_id first."""
+        claims = pd.DataFrame(
+            {
+                "claim_id": ["CLM003", "CLM001", "CLM002"],
+                "service_day": [100, 60, 95],
+                "procedure_code": ["99213", "99213", "99213"],
+                "charge_amount": [100.0, 100.0, 95.0],
+                "is_anchor": [True, True, True],
+            }
+        )
+
+        pairs = _pairs_within_window(claims, window_days=30, threshold=0.9)
+
+        assert list(zip(pairs.claim_id, pairs.near_duplicate_of, strict=True)) == [("CLM003", "CLM002")]
+
+    def test_best_match_kept_per_claim(self) -> None:
+        """Test that each claim keeps only its highest-scoring match above the threshold."""
+        claims = pd.DataFrame(
+            {
+                "claim_id": ["CLM001", "CLM002", "CLM003", "CLM004"],
+                "service_day": [10, 11, 12, 13],
+                "procedure_code": ["99213", "99213", "99214", "99213"],
+                "charge_amount": [100.0, 90.0, 100.0, 99.0],
+                "is_anchor": [True, True, True, True],
+            }
+        )
+
+        pairs = _pairs_within_window(claims, window_days=5, threshold=0.9)
+
+        # CLM003 has a different procedure (score <= 0.4); CLM004 is closest to CLM001
+        assert dict(zip(pairs.claim_id, pairs.near_duplicate_of, strict=True)) == {"CLM002": "CLM001", "CLM004": "CLM001"}
+
+    def test_zero_charges_not_paired(self) -> None:
+        """Test that pairs of zero charges produce no candidates."""
+        claims = pd.DataFrame(
+            {
+                "claim_id": ["CLM001", "CLM002", "CLM003"],
+                "service_day": [10, 20, 21],
+                "procedure_code": ["99213", "99213", "99213"],
+                "charge_amount": [100.0, 0.0, 0.0],
+                "is_anchor": [True, True, True],
+            }
+        )
+
+        pairs = _pairs_within_window(claims, window_days=5, threshold=0.0)
+
+        assert pairs.empty
+
+    def test_only_anchors_are_matched(self) -> None:
+        """Test that claims from neighbouring buckets are only used as match targets."""
+        claims = pd.DataFrame(
+            {
+                "claim_id": ["CLM001", "CLM002", "CLM003"],
+                "service_day": [10, 12, 14],
+                "procedure_code": ["99213", "99213", "99213"],
+                "charge_amount": [100.0, 100.0, 100.0],
+                "is_anchor": [False, True, False],
+            }
+        )
+
+        pairs = _pairs_within_window(claims, window_days=5, threshold=0.9)
+
+        assert list(zip(pairs.claim_id, pairs.near_duplicate_of, strict=True)) == [("CLM002", "CLM001")]
@@ -1,14 +1,19 @@
 """Tests for geographic anomaly detection rules."""
 
+import math
 from datetime import date
 from decimal import Decimal
 
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
 import pytest
 from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
 from pyspark.sql.types import (
     DateType,
     DecimalType,
     DoubleType,
+    FloatType,
     StringType,
     StructField,
     StructType,
@@ -16,6 +21,7 @@ from pyspark.sql.types import (
 
 from fraud_detection.detector import DetectionConfig
 from fraud_detection.rules.geographic import GeographicRules
+from fraud_detection.schema import encode_states
 
 
 class TestGeographicRules:
@@ -31,42 +37,6 @@ class TestGeographicRules:
         """Create GeographicRules instance."""
         return GeographicRules(spark, config)
 
-    @pytest.fixture
-    def claims_schema_with_coords(self) -> StructType:
-        """Schema with coordinate columns."""
-        return StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-                StructField("patient_lat", DoubleType(), True),
-                StructField("patient_lon", DoubleType(), True),
-                StructField("provider_lat", DoubleType(), True),
-                StructField("provider_lon", DoubleType(), True),
-            ]
-        )
-
-    @pytest.fixture
-    def claims_schema_basic(self) -> StructType:
-        """Basic schema without coordinates."""
-        return StructType(
-            [
-                StructField("claim_id", StringType(), False),
-                StructField("patient_id", StringType(), False),
-                StructField("provider_id", StringType(), False),
-                StructField("procedure_code", StringType(), False),
-                StructField("service_date", DateType(), False),
-                StructField("charge_amount", DecimalType(10, 2), False),
-                StructField("patient_state", StringType(), True),
-                StructField("provider_state", StringType(), True),
-            ]
-        )
-
     def test_check_provider_patient_distance_with_coords(
         self,
         rules: GeographicRules,
@@ -126,11 +96,75 @@ class TestGeographicRules:
         assert far["distance_exceeded"] is True
         assert far["distance_miles"] > 2000  # LA to NY is ~2450 miles
 
+    def test_apply_all_matches_individual_checks(
+        self,
+        rules: GeographicRules,
+        spark: SparkSession,
+        claims_schema_with_coords: StructType,
+    ) -> None:
+        """Test that the fused projection gives the same columns and flags as the individual checks."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, 34.06, -118.26),
+            ("CLM002", "PAT002", "PRV002", "99213", date(2024, 1, 16), d("100.00"), "NY", "CA", 40.71, -74.01, 34.05, -118.25),
+        ]
+        claims = spark.createDataFrame(data, claims_schema_with_coords)  # type: ignore[arg-type]
+        flag_columns = ["distance_exceeded", "state_mismatch"]
+
+        individual = rules.check_state_mismatch(rules.check_provider_patient_distance(claims))
+        fused = rules.apply_all(claims)
+
+        assert individual.columns == fused.columns
+        assert sorted(individual.select("claim_id", *flag_columns).collect()) == sorted(fused.select("claim_id", *flag_columns).collect())
+
+    def test_distance_bounds_match_haversine(
+        self,
+        rules: GeographicRules,
+        spark: SparkSession,
+        claims_schema_with_coords: StructType,
+    ) -> None:
+        """Test that the bounded distance flag agrees with the full haversine comparison."""
+        d = Decimal
+        pairs = [
+            (34.05, -118.25, 34.06, -118.26),  # same neighbourhood: under both bounds
+            (40.71, -74.01, 34.05, -118.25),  # latitude gap alone exceeds the limit
+            (34.05, -118.25, 34.05, -116.55),  # ~97 miles due east: haversine decides
+            (34.05, -118.25, 34.05, -116.45),  # ~103 miles due east: haversine decides
+            (64.00, -150.00, 64.00, -147.00),  # ~91 miles at Alaskan latitudes despite a 3 degree gap
+            (None, -118.25, 34.05, -118.25),
+        ]
+        data = [
+            (f"CLM{i:03d}", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", *pair)
+            for i, pair in enumerate(pairs)
+        ]
+        claims = spark.createDataFrame(data, claims_schema_with_coords)  # type: ignore[arg-type]
+
+        result = claims.withColumns(rules.distance_columns(claims, include_distance=False))
+        reference = rules.check_provider_patient_distance(claims)
+
+        assert "distance_miles" not in result.columns
+        bounded = sorted(result.select("claim_id", "distance_exceeded").collect())
+        assert bounded == sorted(reference.select("claim_id", "distance_exceeded").collect())
+        assert [row.distance_exceeded for row in bounded] == [False, True, False, True, False, None]
+
+    def test_distance_threshold_beyond_half_circumference(self, spark: SparkSession, claims_schema_with_coords: StructType) -> None:
+        """Test that a threshold no distance can exceed never flags, even for antipodal pairs."""
+        rules = GeographicRules(spark, DetectionConfig(max_provider_patient_distance_miles=20000.0))
+        d = Decimal
+        data = [("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 10.0, 0.0, -10.0, 180.0)]
+        claims = spark.createDataFrame(data, claims_schema_with_coords)  # type: ignore[arg-type]
+
+        result = claims.withColumns(rules.distance_columns(claims, include_distance=False))
+
+        row = result.first()
+        assert row
+        assert row["distance_exceeded"] is False
+
     def test_check_provider_patient_distance_without_coords(
         self,
         rules: GeographicRules,
         spark: SparkSession,
-        claims_schema_basic: StructType,
+        claims_schema: StructType,
     ) -> None:
         """Test distance check without coordinates falls back gracefully."""
         d = Decimal
@@ -138,19 +172,19 @@ class TestGeographicRules:
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM002", "PAT002", "PRV002", "99213", date(2024, 1, 16), d("100.00"), "NY", "CA"),
         ]
-        claims = spark.createDataFrame(data, claims_schema_basic)  # type: ignore[arg-type]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
 
         result = rules.check_provider_patient_distance(claims)
 
         # distance_exceeded should be False for all when no coordinates
         assert "distance_exceeded" in result.columns
-        assert result.filter(result.distance_exceeded).count() == 0
+        assert result.filter(result.distance_exceeded).limit(1).collect() == []
 
     def test_check_state_mismatch(
         self,
         rules: GeographicRules,
         spark: SparkSession,
-        claims_schema_basic: StructType,
+        claims_schema: StructType,
     ) -> None:
         """Test state mismatch detection."""
         d = Decimal
@@ -164,7 +198,7 @@ class TestGeographicRules:
             # Null provider state
             ("CLM004", "PAT004", "PRV004", "99213", date(2024, 1, 18), d("100.00"), "CA", None),
         ]
-        claims = spark.createDataFrame(data, claims_schema_basic)  # type: ignore[arg-type]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
 
         result = rules.check_state_mismatch(claims)
 
@@ -189,6 +223,29 @@ class TestGeographicRules:
         assert null_provider
         assert null_provider["state_mismatch"] is False
 
+    def test_check_state_mismatch_encoded_states(
+        self,
+        rules: GeographicRules,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that encoded state codes give the same result, falling back to strings for unknown states."""
+        d = Decimal
+        data: list[tuple[str, str, str, str, date, Decimal, str | None, str | None]] = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT002", "PRV002", "99213", date(2024, 1, 16), d("100.00"), "NY", "CA"),
+            # Not in STATE_CODES: compared as strings
+            ("CLM003", "PAT003", "PRV003", "99213", date(2024, 1, 17), d("100.00"), "XX", "CA"),
+            ("CLM004", "PAT004", "PRV004", "99213", date(2024, 1, 18), d("100.00"), "XX", "XX"),
+            ("CLM005", "PAT005", "PRV005", "99213", date(2024, 1, 19), d("100.00"), None, "CA"),
+        ]
+        claims = encode_states(spark.createDataFrame(data, claims_schema))  # type: ignore[arg-type]
+
+        result = rules.check_state_mismatch(claims)
+
+        flags = {row.claim_id: row.state_mismatch for row in result.collect()}
+        assert flags == {"CLM001": False, "CLM002": True, "CLM003": True, "CLM004": False, "CLM005": False}
+
     def test_check_state_mismatch_no_state_columns(
         self,
         rules: GeographicRules,
@@ -215,49 +272,37 @@ class TestGeographicRules:
         result = rules.check_state_mismatch(claims)
 
         assert "state_mismatch" in result.columns
-        assert result.filter(result.state_mismatch).count() == 0
+        assert result.filter(result.state_mismatch).limit(1).collect() == []
 
     def test_check_geographic_clustering(
         self,
         rules: GeographicRules,
         spark: SparkSession,
-        claims_schema_basic: StructType,
+        claims_schema: StructType,
     ) -> None:
         """Test geographic clustering detection."""
-        d = Decimal
-        data: list[tuple[str, str, str, str, date, Decimal, str, str]] = []
-
-        # Provider with 150 patients all from NY but provider in CA (suspicious)
-        for i in range(150):
-            data.append(
-                (
-                    f"CLM_CLUST{i:03d}",
-                    f"PAT_CLUST{i:03d}",
-                    "PRV_CLUSTERED",
-                    "99213",
-                    date(2024, 1, 15),
-                    d("100.00"),
-                    "NY",
-                    "CA",
-                )
-            )
-
-        # Normal provider with patients from multiple states
-        for i, state in enumerate(["CA", "CA", "CA", "NV", "AZ", "OR", "WA", "CA", "CA", "CA"]):
-            data.append(
-                (
-                    f"CLM_NORM{i:03d}",
-                    f"PAT_NORM{i:03d}",
-                    "PRV_NORMAL",
-                    "99213",
-                    date(2024, 1, 15),
-                    d("100.00"),
-                    state,
-                    "CA",
-                )
-            )
-
-        claims = spark.createDataFrame(data, claims_schema_basic)  # type: ignore[arg-type]
+        # Provider with 150 patients all from NY but provider in CA (suspicious), then a
+        # normal provider with patients from multiple states
+        suffixes = np.concatenate(
+            [
+                np.char.add("_CLUST", np.char.zfill(np.arange(150).astype(str), 3)),
+                np.char.add("_NORM", np.char.zfill(np.arange(10).astype(str), 3)),
+            ]
+        )
+        data = pd.DataFrame(
+            {
+                "claim_id": np.char.add("CLM", suffixes),
+                "patient_id": np.char.add("PAT", suffixes),
+                "provider_id": np.repeat(["PRV_CLUSTERED", "PRV_NORMAL"], [150, 10]),
+                "procedure_code": "99213",
+                "service_date": date(2024, 1, 15),
+                "charge_amount": Decimal("100.00"),
+                "patient_state": ["NY"] * 150 + ["CA", "CA", "CA", "NV", "AZ", "OR", "WA", "CA", "CA", "CA"],
+                "provider_state": "CA",
+            }
+        )
+
+        claims = spark.createDataFrame(data, claims_schema)
 
         result = rules.check_geographic_clustering(claims)
 
@@ -365,7 +410,7 @@ class TestGeographicRules:
 
         assert "impossible_travel_flag" in result.columns
         assert "num_providers_same_day" in result.columns
-        assert "provider_locations" in result.columns
+        assert "provider_lats" not in result.columns
 
         # Patient with impossible travel should be flagged
         travel_claims = result.filter(result.patient_id == "PAT_TRAVEL").collect()
@@ -378,11 +423,55 @@ class TestGeographicRules:
         assert normal
         assert normal["impossible_travel_flag"] is False
 
+    def test_check_impossible_travel_counts_distinct_locations(
+        self,
+        rules: GeographicRules,
+        spark: SparkSession,
+        claims_schema_with_coords: StructType,
+    ) -> None:
+        """Test that repeat visits to one location count once and locations are collected on request."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, 34.06, -118.26),
+            ("CLM002", "PAT001", "PRV001", "99214", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, 34.06, -118.26),
+            ("CLM003", "PAT001", "PRV002", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, 34.10, -118.30),
+        ]
+        claims = spark.createDataFrame(data, claims_schema_with_coords)  # type: ignore[arg-type]
+
+        result = rules.check_impossible_travel(claims, include_locations=True)
+
+        for row in result.collect():
+            assert row["num_providers_same_day"] == 2
+            assert sorted(zip(row["provider_lats"], row["provider_lons"])) == [(34.06, -118.26), (34.06, -118.26), (34.10, -118.30)]
+            assert row["impossible_travel_flag"] is False
+
+    def test_check_impossible_travel_locations_stay_aligned(
+        self,
+        rules: GeographicRules,
+        spark: SparkSession,
+        claims_schema_with_coords: StructType,
+    ) -> None:
+        """Test that a claim missing one provider coordinate is left out of both location arrays."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, 34.06, -118.26),
+            ("CLM002", "PAT001", "PRV002", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA", 34.05, -118.25, None, -118.30),
+            ("CLM003", "PAT002", "PRV001", "99213", date(2024, 1, 16), d("100.00"), "CA", "CA", 34.05, -118.25, 34.06, -118.26),
+        ]
+        claims = spark.createDataFrame(data, claims_schema_with_coords)  # type: ignore[arg-type]
+
+        result = rules.check_impossible_travel(claims, include_locations=True)
+
+        assert result.count() == 3
+        for row in result.filter(result.patient_id == "PAT001").collect():
+            assert row["provider_lats"] == [34.06]
+            assert row["provider_lons"] == [-118.26]
+
     def test_check_impossible_travel_without_coords(
         self,
         rules: GeographicRules,
         spark: SparkSession,
-        claims_schema_basic: StructType,
+        claims_schema: StructType,
     ) -> None:
         """Test impossible travel without coordinates falls back gracefully."""
         d = Decimal
@@ -390,12 +479,12 @@ class TestGeographicRules:
             ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
             ("CLM002", "PAT001", "PRV002", "99213", date(2024, 1, 15), d("100.00"), "CA", "NY"),
         ]
-        claims = spark.createDataFrame(data, claims_schema_basic)  # type: ignore[arg-type]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
 
         result = rules.check_impossible_travel(claims)
 
         assert "impossible_travel_flag" in result.columns
-        assert result.filter(result.impossible_travel_flag).count() == 0
+        assert result.filter(result.impossible_travel_flag).limit(1).collect() == []
 
     def test_haversine_distance_calculation(
         self,
@@ -430,3 +519,29 @@ class TestGeographicRules:
         # Allow 10% tolerance for earth radius approximations
         assert row
         assert 310 < row["distance_miles"] < 380
+
+        # Matches a direct evaluation of the haversine formula, up to the single-precision coordinates
+        lat1, lon1, lat2, lon2 = map(math.radians, (34.05, -118.25, 37.77, -122.42))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        assert row["distance_miles"] == pytest.approx(2 * 3959.0 * math.asin(math.sqrt(h)), rel=1e-5)
+        assert isinstance(result.schema["patient_lat"].dataType, FloatType)
+
+    def test_equirectangular_distance_close_to_haversine(self, rules: GeographicRules, spark: SparkSession) -> None:
+        """Test the flat-projection approximation against haversine, including across the antimeridian."""
+        schema = StructType([StructField(name, DoubleType(), False) for name in ("lat1", "lon1", "lat2", "lon2")])
+        pairs = [
+            (34.05, -118.25, 37.77, -122.42),  # LA to SF
+            (61.22, -149.90, 64.84, -147.72),  # Anchorage to Fairbanks
+            (51.88, 179.50, 51.88, -179.50),  # Aleutians, straddling the antimeridian
+        ]
+        points = spark.createDataFrame(pairs, schema)  # type: ignore[arg-type]
+        columns = (F.col("lat1"), F.col("lon1"), F.col("lat2"), F.col("lon2"))
+
+        # pylint: disable=protected-access
+        result = points.select(
+            rules._equirectangular_distance(*columns).alias("approx"),  # pyright: ignore[reportPrivateUsage]
+            rules._haversine_distance(*columns).alias("exact"),  # pyright: ignore[reportPrivateUsage]
+        ).collect()
+
+        for row in result:
+            assert row.approx == pytest.approx(row.exact, rel=0.01)
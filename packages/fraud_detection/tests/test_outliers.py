@@ -1,14 +1,18 @@
 """Tests for outlier detection."""
 
+import logging
 from datetime import date
 from decimal import Decimal
 
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
 import pytest
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.types import DecimalType, StringType, StructField, StructType
 
 from fraud_detection.detector import DetectionConfig
-from fraud_detection.statistics.outliers import OutlierDetector
+from fraud_detection.statistics.outliers import OutlierDetector, _rolling_baseline  # pyright: ignore[reportPrivateUsage]
 
 
 class TestOutlierDetector:
@@ -23,6 +27,40 @@ class TestOutlierDetector:
         )
         return OutlierDetector(spark, config)
 
+    def test_detect_all_matches_individual_checks(
+        self,
+        detector: OutlierDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that detect_all adds every check's columns and releases its cache."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT002", "PRV001", "99213", date(2024, 1, 22), d("105.00"), "CA", "CA"),
+            ("CLM003", "PAT003", "PRV002", "99213", date(2024, 1, 29), d("400.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+        flag_columns = ["procedure_charge_outlier", "provider_billing_outlier", "temporal_spike_flag"]
+
+        individual = detector.detect_temporal_outliers(detector.detect_provider_outliers(detector.detect_procedure_outliers(claims)))
+        combined = detector.detect_all(claims)
+
+        assert not claims.is_cached
+        assert set(individual.columns) == set(combined.columns)
+        assert sorted(individual.select("claim_id", *flag_columns).collect()) == sorted(combined.select("claim_id", *flag_columns).collect())
+
+    def test_warns_when_adaptive_execution_disabled(self, spark: SparkSession, caplog: pytest.LogCaptureFixture) -> None:
+        """Test that constructing the detector on a session without AQE logs a warning."""
+        spark.conf.set("spark.sql.adaptive.enabled", "false")
+        try:
+            with caplog.at_level(logging.WARNING, logger="fraud_detection.statistics.outliers"):
+                OutlierDetector(spark, DetectionConfig())
+        finally:
+            spark.conf.set("spark.sql.adaptive.enabled", "true")
+
+        assert "Adaptive query execution is disabled" in caplog.text
+
     def test_zscore_outliers_detected(
         self,
         detector: OutlierDetector,
@@ -134,6 +172,24 @@ class TestOutlierDetector:
         # No outliers in perfectly uniform data
         assert outliers == 0
 
+    def test_zscore_adds_only_flag_column(
+        self,
+        detector: OutlierDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that only the flag is added and a single-claim group (no stddev) is not flagged."""
+        d = Decimal
+        data = [("CLM001", "PAT001", "PRV001", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA")]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect_zscore_outliers(claims, "charge_amount", "is_outlier", group_by=["procedure_code"])
+
+        assert result.columns == [*claims.columns, "is_outlier"]
+        row = result.first()
+        assert row
+        assert row["is_outlier"] is False
+
     def test_grouped_iqr_outliers(
         self,
         detector: OutlierDetector,
@@ -161,6 +217,54 @@ class TestOutlierDetector:
 
         # Check that outlier column exists
         assert "is_outlier" in result.columns
+        assert {row["claim_id"] for row in result.filter(result.is_outlier).collect()} == {"CLM004"}
+
+    def test_global_statistics_run_no_job_until_action(self, detector: OutlierDetector, spark: SparkSession, sample_claims: DataFrame) -> None:
+        """Test that ungrouped detection stays lazy instead of collecting its statistics at call time."""
+        spark.sparkContext.setJobGroup("global-outlier-statistics", "ungrouped outlier detection")
+        try:
+            result = detector.detect_zscore_and_iqr_outliers(sample_claims, "charge_amount", "zscore_flag", "iqr_flag")
+            assert spark.sparkContext.statusTracker().getJobIdsForGroup("global-outlier-statistics") == []
+
+            assert {row["claim_id"] for row in result.filter(result.zscore_flag).collect()} == {"CLM004"}
+        finally:
+            spark.sparkContext.setLocalProperty("spark.jobGroup.id", None)  # type: ignore[arg-type]
+
+    def test_zscore_outliers_without_values(self, detector: OutlierDetector, spark: SparkSession) -> None:
+        """Test that a column with no non-null values flags nothing instead of failing."""
+        schema = StructType([StructField("claim_id", StringType(), False), StructField("charge_amount", DecimalType(12, 2), True)])
+        claims = spark.createDataFrame([("CLM001", None), ("CLM002", None)], schema)  # type: ignore[arg-type]
+
+        result = detector.detect_zscore_outliers(claims, "charge_amount", "is_outlier")
+
+        assert result.columns == ["claim_id", "charge_amount", "is_outlier"]
+        assert [row["is_outlier"] for row in result.collect()] == [False, False]
+
+    def test_iqr_outliers_without_values(self, detector: OutlierDetector, spark: SparkSession) -> None:
+        """Test that a column with no non-null values leaves the flag null instead of failing."""
+        schema = StructType([StructField("claim_id", StringType(), False), StructField("charge_amount", DecimalType(12, 2), True)])
+        claims = spark.createDataFrame([("CLM001", None), ("CLM002", None)], schema)  # type: ignore[arg-type]
+
+        result = detector.detect_iqr_outliers(claims, "charge_amount", "is_outlier")
+
+        assert [row["is_outlier"] for row in result.collect()] == [None, None]
+
+    @pytest.mark.parametrize("group_by", [None, ["procedure_code"]])
+    def test_zscore_and_iqr_outliers_match_separate_methods(
+        self, detector: OutlierDetector, sample_claims: DataFrame, group_by: list[str] | None
+    ) -> None:
+        """Test that the combined method adds the same flags as the two methods run separately."""
+        separate = detector.detect_iqr_outliers(
+            detector.detect_zscore_outliers(sample_claims, "charge_amount", "zscore_flag", group_by=group_by),
+            "charge_amount",
+            "iqr_flag",
+            group_by=group_by,
+        )
+
+        combined = detector.detect_zscore_and_iqr_outliers(sample_claims, "charge_amount", "zscore_flag", "iqr_flag", group_by=group_by)
+
+        assert combined.columns == [*sample_claims.columns, "zscore_flag", "iqr_flag"]
+        assert sorted(combined.collect()) == sorted(separate.collect())
 
     def test_detect_procedure_outliers(
         self,
@@ -191,6 +295,18 @@ class TestOutlierDetector:
         assert len(outliers) == 1
         assert outliers[0]["claim_id"] == "CLM004"
 
+    def test_procedure_outliers_by_integer_code(self, detector: OutlierDetector, sample_claims: DataFrame) -> None:
+        """Test that grouping by an integer procedure code flags the same claims as the string code."""
+        claims = sample_claims.withColumn("procedure_code_id", F.col("procedure_code").cast("int"))
+
+        by_string = detector.detect_procedure_outliers(claims)
+        by_code = detector.detect_procedure_outliers(claims, procedure_column="procedure_code_id")
+
+        def flags(result: DataFrame) -> list[tuple[str, bool]]:
+            return sorted((row["claim_id"], row["procedure_charge_outlier"]) for row in result.collect())
+
+        assert flags(by_code) == flags(by_string)
+
     def test_detect_provider_outliers(
         self,
         detector: OutlierDetector,
@@ -291,6 +407,57 @@ class TestOutlierDetector:
         spikes = result.filter(result.temporal_spike_flag).count()
         assert spikes == 0
 
+    def test_temporal_baseline_is_previous_28_days(
+        self,
+        detector: OutlierDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that the baseline spans the 28 preceding days, regardless of claim count or year boundary."""
+        d = Decimal
+        data = [
+            # Cheap history more than 28 days back: outside every later baseline, so CLM003 has none
+            ("CLM001", "PAT001", "PRV001", "99213", date(2023, 11, 1), d("10.00"), "CA", "CA"),
+            ("CLM002", "PAT002", "PRV001", "99213", date(2023, 11, 2), d("10.00"), "CA", "CA"),
+            # Baseline across the new year, more than four claims
+            ("CLM003", "PAT003", "PRV001", "99213", date(2023, 12, 20), d("100.00"), "CA", "CA"),
+            ("CLM004", "PAT004", "PRV001", "99213", date(2023, 12, 27), d("100.00"), "CA", "CA"),
+            ("CLM005", "PAT005", "PRV001", "99213", date(2023, 12, 31), d("100.00"), "CA", "CA"),
+            ("CLM006", "PAT006", "PRV001", "99213", date(2024, 1, 2), d("100.00"), "CA", "CA"),
+            ("CLM007", "PAT007", "PRV001", "99213", date(2024, 1, 5), d("100.00"), "CA", "CA"),
+            # Same-day claims are not part of each other's baseline
+            ("CLM008", "PAT008", "PRV001", "99213", date(2024, 1, 10), d("250.00"), "CA", "CA"),
+            ("CLM009", "PAT009", "PRV001", "99213", date(2024, 1, 10), d("350.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect_temporal_outliers(claims)
+
+        flagged = {row["claim_id"] for row in result.filter(result.temporal_spike_flag).collect()}
+        assert flagged == {"CLM009"}
+
+    def test_provider_outliers_market_average_weighted_by_claims(
+        self,
+        detector: OutlierDetector,
+        spark: SparkSession,
+        claims_schema: StructType,
+    ) -> None:
+        """Test that the market average is over claims, not an average of provider averages."""
+        d = Decimal
+        data = [
+            ("CLM001", "PAT001", "PRV_A", "99213", date(2024, 1, 15), d("100.00"), "CA", "CA"),
+            ("CLM002", "PAT002", "PRV_A", "99213", date(2024, 1, 16), d("100.00"), "CA", "CA"),
+            ("CLM003", "PAT003", "PRV_A", "99213", date(2024, 1, 17), d("100.00"), "CA", "CA"),
+            ("CLM004", "PAT004", "PRV_B", "99213", date(2024, 1, 18), d("500.00"), "CA", "CA"),
+        ]
+        claims = spark.createDataFrame(data, claims_schema)  # type: ignore[arg-type]
+
+        result = detector.detect_provider_outliers(claims)
+
+        # Market average is 800 / 4 = 200
+        ratios = {row.provider_id: (float(row.charge_deviation_ratio), row.provider_billing_outlier) for row in result.collect()}
+        assert ratios == {"PRV_A": (pytest.approx(0.5), False), "PRV_B": (pytest.approx(2.5), True)}
+
     def test_provider_outliers_zero_market_avg(
         self,
         detector: OutlierDetector,
@@ -314,3 +481,43 @@ class TestOutlierDetector:
         row = result.first()
         assert row
         assert row["charge_deviation_ratio"] == 1.0
+
+
+class TestRollingBaseline:
+    """Tests for the per-provider trailing average."""
+
+    def test_baseline_covers_preceding_days_only(self) -> None:
+        """Test that each day averages the charges of the window before it, excluding itself."""
+        daily = pd.DataFrame(
+            {
+                "provider_id": ["PRV001"] * 4,
+                "_day": [40, 10, 30, 20],
+                "_charge_sum": [400.0, 100.0, 300.0, 200.0],
+                "_charge_count": [1, 1, 3, 1],
+            }
+        )
+
+        result = _rolling_baseline(daily, window_days=20)
+
+        averages = dict(zip(result["_day"], result["_rolling_avg"], strict=True))
+        assert np.isnan(averages[10])
+        assert averages[20] == pytest.approx(100.0)
+        # Days 10 and 20: (100 + 200) / 2 claims
+        assert averages[30] == pytest.approx(150.0)
+        # Days 20 and 30: (200 + 300) / 4 claims; day 10 is 30 days back
+        assert averages[40] == pytest.approx(125.0)
+
+    def test_days_without_charges_give_no_baseline(self) -> None:
+        """Test that a range holding only null charges has no average rather than zero."""
+        daily = pd.DataFrame(
+            {
+                "provider_id": ["PRV001", "PRV001"],
+                "_day": [10, 11],
+                "_charge_sum": [None, 50.0],
+                "_charge_count": [0, 1],
+            }
+        )
+
+        result = _rolling_baseline(daily, window_days=28)
+
+        assert result["_rolling_avg"].isna().all()
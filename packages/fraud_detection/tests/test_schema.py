@@ -0,0 +1,83 @@
+"""Tests for claims schema helpers."""
+
+from datetime import date
+from decimal import Decimal
+
+from pyspark.sql import SparkSession
+from pyspark.sql.types import DateType, DecimalType, ShortType, StringType, StructField, StructType
+
+from fraud_detection.schema import STATE_CODES, coerce_claim_types, encode_states
+
+
+class TestCoerceClaimTypes:
+    """Tests for coerce_claim_types."""
+
+    def test_string_columns_are_cast(self, spark: SparkSession) -> None:
+        """Test that string service dates and charges are cast to their canonical types."""
+        schema = StructType(
+            [
+                StructField("claim_id", StringType(), False),
+                StructField("service_date", StringType(), False),
+                StructField("charge_amount", StringType(), False),
+            ]
+        )
+        claims = spark.createDataFrame([("CLM001", "2024-01-15", "125.50")], schema)  # type: ignore[arg-type]
+
+        result = coerce_claim_types(claims)
+
+        assert result.schema["service_date"].dataType == DateType()
+        assert result.schema["charge_amount"].dataType == DecimalType(12, 2)
+        row = result.collect()[0]
+        assert row.service_date == date(2024, 1, 15)
+        assert row.charge_amount == Decimal("125.50")
+
+    def test_typed_claims_returned_unchanged(self, spark: SparkSession, claims_schema: StructType) -> None:
+        """Test that already-typed claims, or claims missing the columns, are not re-projected."""
+        claims = spark.createDataFrame([], claims_schema)  # type: ignore[arg-type]
+        ids_only = claims.select("claim_id")
+
+        assert coerce_claim_types(claims) is claims
+        assert coerce_claim_types(ids_only) is ids_only
+
+
+class TestEncodeStates:
+    """Tests for encode_states."""
+
+    def test_states_encoded_to_short_codes(self, spark: SparkSession) -> None:
+        """Test that known states map to their codes and unknown or null states to null."""
+        schema = StructType(
+            [
+                StructField("claim_id", StringType(), False),
+                StructField("patient_state", StringType(), True),
+                StructField("provider_state", StringType(), True),
+            ]
+        )
+        data = [("CLM001", "CA", "NY"), ("CLM002", "XX", None)]
+        claims = spark.createDataFrame(data, schema)  # type: ignore[arg-type]
+
+        result = encode_states(claims)
+
+        assert result.schema["patient_state_code"].dataType == ShortType()
+        rows = {row.claim_id: row for row in result.collect()}
+        assert rows["CLM001"].patient_state_code == STATE_CODES["CA"]
+        assert rows["CLM001"].provider_state_code == STATE_CODES["NY"]
+        assert rows["CLM002"].patient_state_code is None
+        assert rows["CLM002"].provider_state_code is None
+
+    def test_missing_state_columns_skipped(self, spark: SparkSession) -> None:
+        """Test that only the state columns present are encoded."""
+        schema = StructType(
+            [
+                StructField("claim_id", StringType(), False),
+                StructField("patient_state", StringType(), True),
+            ]
+        )
+        claims = spark.createDataFrame([("CLM001", "TX")], schema)  # type: ignore[arg-type]
+
+        result = encode_states(claims)
+
+        assert result.columns == ["claim_id", "patient_state", "patient_state_code"]
+
+    def test_codes_are_unique(self) -> None:
+        """Test that every state abbreviation has a distinct code."""
+        assert len(set(STATE_CODES.values())) == len(STATE_CODES)
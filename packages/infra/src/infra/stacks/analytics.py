@@ -155,6 +155,7 @@ class AnalyticsStack(cdk.Stack):
                 ),
                 partition_keys=[
                     glue.CfnTable.ColumnProperty(name="detection_date", type="date"),
+                    glue.CfnTable.ColumnProperty(name="provider_bucket", type="int"),
                 ],
             ),
         )
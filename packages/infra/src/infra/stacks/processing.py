@@ -376,6 +376,8 @@ class ProcessingStack(cdk.Stack):
                     ),
                     "--output",
                     f"s3://{results_bucket.bucket_name}/flagged/",
+                    "--format",
+                    "csv",
                 ),
             },
         )